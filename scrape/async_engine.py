@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from politeness import polite_request_async
+from theater_parsers import FETCH_HTTP, get_parser, get_theater_series
+from theater_scrape import (
+    HTTP_TIMEOUT,
+    HTTP_USER_AGENT,
+    ScrapeOptions,
+    build_theater_result,
+    get_theater_url,
+    http_capable,
+    http_validators,
+    interleave_domains,
+    parse_http_response,
+)
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+# Theaters fetched or parsed at the same time across all hosts
+MAX_IN_FLIGHT = 32
+# Connections to one host; most theaters of a chain share its domain
+PER_HOST = 4
+PARSE_WORKERS = 4
+
+
+async def fetch_html_async(session, url, validators=None, scheduler=None):
+    """The asyncio counterpart of movie_scraper.fetch_html"""
+    headers = {}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    async with polite_request_async(scheduler, url) as outcome:
+        async with session.get(url, headers=headers) as response:
+            outcome.set_response(response.status, response.headers)
+            if response.status == 304:
+                return None, response.headers
+            response.raise_for_status()
+            return await response.read(), response.headers
+
+
+class AsyncEngine:
+    """
+    Scrapes the HTTP-fetchable theaters of a run on one event loop.
+    All requests share one pooled aiohttp session, limited to `per_host`
+    connections per host and `max_in_flight` theaters overall, and pages are
+    parsed on a thread pool so the loop keeps fetching meanwhile.
+    """
+
+    def __init__(
+        self,
+        options=None,
+        max_in_flight=MAX_IN_FLIGHT,
+        per_host=PER_HOST,
+        parse_workers=PARSE_WORKERS,
+    ):
+        if aiohttp is None:
+            raise RuntimeError("The async engine needs aiohttp (pip install aiohttp)")
+        self.options = options or ScrapeOptions()
+        self.max_in_flight = max_in_flight
+        self.per_host = per_host
+        self.parse_workers = parse_workers
+
+    async def _run_blocking(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, func, *args
+        )
+
+    async def _scrape_theater(self, session, theater):
+        """
+        Scrape one theater the way scrape_theater_http does.
+        Returns (result, fell_back): fell_back is True when the theater is left to
+        the threaded path, because its chain needs the browser, HTTP found no
+        movies, or it failed and needs the retry and stale-record policy.
+        """
+        options = self.options
+        theater_name = theater["theater_name"]
+        series = get_theater_series(theater_name)
+        parser = get_parser(series)
+        if not (options.use_http and parser.fetch_strategy == FETCH_HTTP):
+            return None, True
+        # The threaded path applies the retry, breaker and stale-record policy
+        if not options.breaker.allow(series):
+            return None, True
+
+        async with self._in_flight:
+            start = time.perf_counter()
+            try:
+                # Resolving a URL may hit the search API, which is blocking
+                url = await self._run_blocking(
+                    get_theater_url,
+                    theater_name,
+                    theater.get("theater_name_en", theater_name),
+                    options.url_cache,
+                )
+            except Exception as e:
+                logger.warning(f"Could not resolve the URL of {theater_name}: {e}")
+                return None, True
+            if not http_capable(parser, options):
+                return None, True
+
+            logger.debug("Fetching %s over HTTP", theater_name)
+            try:
+                html, headers = await fetch_html_async(
+                    session,
+                    url,
+                    http_validators(theater_name, options),
+                    options.scheduler,
+                )
+                movies, status = await self._run_blocking(
+                    parse_http_response,
+                    parser,
+                    url,
+                    theater_name,
+                    html,
+                    headers,
+                    options,
+                )
+            except Exception as e:
+                logger.warning(f"HTTP fetch failed for {theater_name}: {e}")
+                return None, True
+            if not movies:
+                logger.info(f"No movies in the HTTP response for {theater_name}")
+                return None, True
+
+            options.summary.mark(status)
+            options.breaker.record(series, True)
+            result = build_theater_result(theater_name, theater, movies)
+            logger.info(
+                f"Successfully scraped {theater_name} in "
+                f"{time.perf_counter() - start:.2f}s"
+            )
+            return result, False
+
+    async def run(self, theaters, on_result):
+        """
+        Scrape theaters concurrently, passing each result to `on_result` as soon
+        as it is scraped. Returns the number of theaters scraped and, in their
+        original order, the theaters left for the browser path.
+        """
+        # Tasks take in-flight slots in this order; spread them across domains
+        ordered = interleave_domains(theaters, self.options)
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=self.parse_workers)
+        connector = aiohttp.TCPConnector(
+            limit=self.max_in_flight, limit_per_host=self.per_host
+        )
+        timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+        scraped = 0
+        tasks = []
+        try:
+            async with aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                headers={"User-Agent": HTTP_USER_AGENT},
+            ) as session:
+                tasks = [
+                    asyncio.ensure_future(self._scrape_theater(session, theater))
+                    for theater in ordered
+                ]
+                for next_done in asyncio.as_completed(tasks):
+                    try:
+                        result, _ = await next_done
+                    except Exception as e:
+                        # Left to the threaded path, which retries or reuses it
+                        logger.error(f"Error processing theater: {e}")
+                        continue
+                    if result:
+                        on_result(result)
+                        scraped += 1
+        finally:
+            self._executor.shutdown()
+
+        fell_back = {
+            id(theater)
+            for theater, task in zip(ordered, tasks)
+            if task.exception() or task.result()[1]
+        }
+        leftover = [theater for theater in theaters if id(theater) in fell_back]
+        return scraped, leftover
+
+
+def scrape_theaters_async(theaters, on_result, options=None, **limits):
+    """
+    Run the async engine over theaters. Returns the number scraped and the
+    theaters it could not scrape over HTTP, for the browser path to pick up.
+    """
+    engine = AsyncEngine(options, **limits)
+    return asyncio.run(engine.run(theaters, on_result))
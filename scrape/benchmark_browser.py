@@ -0,0 +1,189 @@
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import replace
+
+from chrome_profile import UNTUNED_PROFILE, ChromeProfile, driver_rss
+from movie_scraper import READY_TIMEOUT, load_page, load_theaters, setup_webdriver
+from theater_parsers import FETCH_BROWSER, get_parser, get_theater_series
+from url_cache import URL_CACHE_PATH, UrlCache
+
+logger = logging.getLogger(__name__)
+
+THEATERS = 10
+# Seconds between memory samples of the Chrome processes
+RSS_INTERVAL = 0.1
+
+
+class RssSampler:
+    """Samples a driver's resident memory on a thread and keeps the peak"""
+
+    def __init__(self, driver, interval=RSS_INTERVAL):
+        self.driver = driver
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, driver_rss(self.driver))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, driver_rss(self.driver))
+
+
+def transferred_bytes(driver):
+    """Bytes received over the network since the performance log was last read"""
+    total = 0
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"])["message"]
+        if message["method"] == "Network.loadingFinished":
+            total += message["params"].get("encodedDataLength", 0)
+    return total
+
+
+def benchmark_rows(url_cache, names, limit):
+    """(theater_name, url, parser) of browser-rendered theaters with a cached URL"""
+    rows = []
+    for theater in load_theaters():
+        theater_name = theater["theater_name"]
+        if names and theater_name not in names:
+            continue
+        parser = get_parser(get_theater_series(theater_name))
+        url = url_cache.get(theater_name, allow_stale=True)
+        if url and (names or parser.fetch_strategy == FETCH_BROWSER):
+            rows.append((theater_name, url, parser))
+    return rows[:limit]
+
+
+def run_profile(profile, rows, timeout):
+    """Load every row on one driver; returns a list of per-theater measurements"""
+    measurements = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Start from a cold cache, which the theaters of a chain then share
+        profile = replace(
+            profile,
+            performance_log=True,
+            cache_dir=cache_dir if profile.cache_dir else None,
+        )
+        driver = setup_webdriver(profile)
+        if not driver:
+            raise RuntimeError("Failed to set up webdriver")
+        try:
+            transferred_bytes(driver)
+            for theater_name, url, parser in rows:
+                start = time.perf_counter()
+                with RssSampler(driver) as sampler:
+                    try:
+                        html = load_page(driver, url, parser.ready_selector, timeout)
+                        ready = time.perf_counter() - start
+                        movies = parser.parse(html)
+                    except Exception as e:
+                        logger.warning(f"{theater_name}: {e}")
+                        ready, movies = None, None
+                # Requests still arriving after readiness count towards the page
+                time.sleep(0.5)
+                measurements.append(
+                    {
+                        "theater_name": theater_name,
+                        "bytes": transferred_bytes(driver),
+                        "ready": ready,
+                        "peak_rss": sampler.peak,
+                        "movies": len(movies) if movies else 0,
+                    }
+                )
+        finally:
+            driver.quit()
+    return measurements
+
+
+def print_measurements(label, measurements):
+    for m in measurements:
+        ready = f"{m['ready']:.2f}" if m["ready"] is not None else "-"
+        print(
+            f"{label:<8} {m['theater_name'][:24]:<24} {m['bytes'] / 1024:>9.0f} "
+            f"{ready:>7} {m['peak_rss'] / 2**20:>8.0f} {m['movies']:>6}"
+        )
+
+
+def print_totals(label, measurements):
+    ready = [m["ready"] for m in measurements if m["ready"] is not None]
+    mean_ready = f"{sum(ready) / len(ready):.2f}" if ready else "-"
+    print(
+        f"{label:<8} {'total / mean / peak':<24} "
+        f"{sum(m['bytes'] for m in measurements) / 1024:>9.0f} {mean_ready:>7} "
+        f"{max(m['peak_rss'] for m in measurements) / 2**20:>8.0f} "
+        f"{sum(m['movies'] for m in measurements):>6}"
+    )
+
+
+def main():
+    """Compare the untuned and the tuned Chrome profile on live schedule pages"""
+    parser = argparse.ArgumentParser(
+        description=(
+            "Measure bytes transferred, time to a rendered schedule and peak "
+            "Chrome memory per theater, before and after tuning the driver profile"
+        )
+    )
+    parser.add_argument(
+        "--url-cache", default=URL_CACHE_PATH, help="Path of the cached theater URLs"
+    )
+    parser.add_argument(
+        "--theater",
+        action="append",
+        help="Theater to load (repeatable); defaults to browser-rendered chains",
+    )
+    parser.add_argument(
+        "--limit", type=int, default=THEATERS, help="Number of theaters to load"
+    )
+    parser.add_argument(
+        "--ready-timeout",
+        type=float,
+        default=READY_TIMEOUT,
+        help="Seconds to wait for each schedule to render",
+    )
+    args = parser.parse_args()
+    # movie_scraper logs every page at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+
+    rows = benchmark_rows(UrlCache(args.url_cache), args.theater, args.limit)
+    if not rows:
+        logger.error(f"No theaters with a cached URL in {args.url_cache}")
+        sys.exit(1)
+
+    print(
+        f"{'profile':<8} {'theater':<24} {'KB':>9} {'ready s':>7} "
+        f"{'peak MB':>8} {'movies':>6}"
+    )
+    results = {}
+    for label, profile in (("untuned", UNTUNED_PROFILE), ("tuned", ChromeProfile())):
+        results[label] = run_profile(profile, rows, args.ready_timeout)
+        print_measurements(label, results[label])
+    for label, measurements in results.items():
+        print_totals(label, measurements)
+
+    # Blocking must not cost any schedule data
+    lost = [
+        before["theater_name"]
+        for before, after in zip(results["untuned"], results["tuned"])
+        if after["movies"] < before["movies"]
+    ]
+    if lost:
+        print(f"FAIL fewer movies with the tuned profile: {', '.join(lost)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
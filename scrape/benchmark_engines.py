@@ -0,0 +1,130 @@
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import async_engine
+from fixture_server import FIXTURES_DIR, FixtureServer
+from fixtures import FixtureStore
+from movie_scraper import DriverPool, ScrapeOptions, scrape_theaters
+from theater_parsers import FETCH_HTTP, TheaterSeries, get_parser
+from url_cache import UrlCache
+
+logger = logging.getLogger(__name__)
+
+
+def benchmark_rows(fixtures, copies):
+    """
+    Theater rows for the HTTP-fetchable fixtures, repeated `copies` times
+    under distinct names, with the base theater each copy was made from.
+    """
+    rows = []
+    for theater_name, entry in fixtures.theaters().items():
+        if get_parser(TheaterSeries[entry["series"]]).fetch_strategy != FETCH_HTTP:
+            continue
+        for copy in range(copies):
+            name = theater_name if copy == 0 else f"{theater_name} #{copy}"
+            rows.append(({"theater_name": name, "theater_name_en": name}, theater_name))
+    return rows
+
+
+def run_engine(engine, rows, server, workers, max_in_flight, per_host):
+    """Scrape the rows with one engine; returns (seconds, {theater_name: movies})"""
+    with tempfile.TemporaryDirectory() as directory:
+        url_cache = UrlCache(os.path.join(directory, "urls.json"))
+        for row, base_name in rows:
+            url_cache.put(row["theater_name"], server.url(base_name))
+        options = ScrapeOptions(url_cache=url_cache)
+        theaters = [row for row, _ in rows]
+        results = {}
+
+        def collect(result):
+            results[result["theater_name"]] = result["movies"]
+
+        start = time.perf_counter()
+        if engine == "async":
+            async_engine.scrape_theaters_async(
+                theaters,
+                collect,
+                options,
+                max_in_flight=max_in_flight,
+                per_host=per_host,
+            )
+        else:
+            # Every row is HTTP-fetchable, so no browser is ever started
+            pool = DriverPool(workers)
+            try:
+                scrape_theaters(pool, theaters, collect, workers, options)
+            finally:
+                pool.close()
+        return time.perf_counter() - start, results
+
+
+def main():
+    """Compare the threaded and asyncio engines against a local fixture server"""
+    parser = argparse.ArgumentParser(
+        description="Measure scraping throughput of each engine on recorded pages"
+    )
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Fixture directory")
+    parser.add_argument(
+        "--copies", type=int, default=50, help="Times to repeat each theater"
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Seconds the stand-in server delays each response",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4, help="Threads for the threaded engine"
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=async_engine.MAX_IN_FLIGHT,
+        help="Theaters in flight for the async engine",
+    )
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=async_engine.PER_HOST,
+        help="Connections per host for the async engine",
+    )
+    args = parser.parse_args()
+    # movie_scraper logs every theater at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+
+    fixtures = FixtureStore(args.fixtures)
+    rows = benchmark_rows(fixtures, args.copies)
+    if not rows:
+        logger.error(f"No HTTP-fetchable fixtures found in {args.fixtures}")
+        sys.exit(1)
+
+    engines = ["threads"]
+    if async_engine.aiohttp is not None:
+        engines.append("async")
+    else:
+        print("aiohttp is not installed; only the threaded engine is measured")
+
+    print(f"{'engine':<8} {'theaters':>8} {'scraped':>7} {'seconds':>8} {'per s':>7}")
+    outputs = {}
+    with FixtureServer(fixtures, args.latency) as server:
+        for engine in engines:
+            seconds, results = run_engine(
+                engine, rows, server, args.workers, args.max_in_flight, args.per_host
+            )
+            outputs[engine] = results
+            print(
+                f"{engine:<8} {len(rows):>8} {len(results):>7} {seconds:>8.2f} "
+                f"{len(results) / seconds:>7.1f}"
+            )
+
+    if len(outputs) == 2 and outputs["threads"] != outputs["async"]:
+        print("FAIL the engines produced different results")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
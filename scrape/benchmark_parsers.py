@@ -0,0 +1,202 @@
+import argparse
+import cProfile
+import json
+import logging
+import pstats
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from fixtures import FixtureStore
+from schedule_model import movies_to_json
+from theater_parsers import DEFAULT_BACKEND, TheaterSeries, get_parser
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = "scrape/fixtures"
+# The original full-page parse that every faster configuration must reproduce
+REFERENCE_BACKEND = "html.parser"
+
+
+def as_json(movies):
+    """Serialize parsed Movies so they compare equal to recorded ones"""
+    return json.loads(json.dumps(movies_to_json(movies), ensure_ascii=False))
+
+
+def benchmark_fixture(parser, html, repeat, backend, strain):
+    """Parse one page `repeat` times and return (seconds per parse, movies)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        movies = parser.parse(html, backend, strain)
+    elapsed = (time.perf_counter() - start) / repeat
+    return elapsed, movies
+
+
+def peak_memory(parser, html, backend, strain):
+    """Return the peak bytes allocated while parsing one page"""
+    tracemalloc.start()
+    try:
+        parser.parse(html, backend, strain)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmark(
+    fixtures,
+    repeat=5,
+    series_filter=None,
+    backend=DEFAULT_BACKEND,
+    strain=True,
+    compare=False,
+):
+    """
+    Parse every recorded page and collect per-chain statistics.
+    With compare, each page must also parse to exactly what the reference
+    full-page html.parser parse produces.
+    Returns (stats by series name, list of theaters whose output changed or broke).
+    """
+    stats = defaultdict(
+        lambda: {
+            "pages": 0,
+            "bytes": 0,
+            "seconds": 0.0,
+            "peak_bytes": 0,
+            "sections": 0,
+            "movies": 0,
+            "showtimes": 0,
+        }
+    )
+    failures = []
+
+    for theater_name, entry in fixtures.theaters().items():
+        series = TheaterSeries[entry["series"]]
+        if series_filter and series.name not in series_filter:
+            continue
+        parser = get_parser(series)
+        html = fixtures.load(theater_name)
+
+        elapsed, movies = benchmark_fixture(parser, html, repeat, backend, strain)
+        sections = parser.sections(parser.make_soup(html, backend, strain))
+
+        chain = stats[series.name]
+        chain["pages"] += 1
+        chain["bytes"] += len(html)
+        chain["seconds"] += elapsed
+        chain["peak_bytes"] = max(
+            chain["peak_bytes"], peak_memory(parser, html, backend, strain)
+        )
+        chain["sections"] += len(sections)
+        chain["movies"] += len(movies or [])
+        chain["showtimes"] += sum(len(movie.showtimes) for movie in movies or [])
+
+        if not movies:
+            failures.append((theater_name, "no movies parsed"))
+        elif as_json(movies) != fixtures.load_expected(theater_name):
+            failures.append((theater_name, "output differs from the recording"))
+        elif compare:
+            reference = parser.parse(html, REFERENCE_BACKEND, strain=False)
+            if as_json(movies) != as_json(reference):
+                failures.append(
+                    (theater_name, f"output differs from {REFERENCE_BACKEND}")
+                )
+
+    return dict(stats), failures
+
+
+def print_report(stats):
+    header = (
+        f"{'series':<8} {'pages':>5} {'KB':>8} {'ms/page':>8} {'peak KB':>8} "
+        f"{'sections':>8} {'movies':>6} {'showtimes':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for name, chain in sorted(stats.items()):
+        pages = chain["pages"]
+        print(
+            f"{name:<8} {pages:>5} {chain['bytes'] / 1024:>8.1f} "
+            f"{chain['seconds'] * 1000 / pages:>8.2f} "
+            f"{chain['peak_bytes'] / 1024:>8.1f} {chain['sections']:>8} "
+            f"{chain['movies']:>6} {chain['showtimes']:>9}"
+        )
+
+
+def main():
+    """Benchmark the chain parsers against recorded schedule pages"""
+    parser = argparse.ArgumentParser(
+        description="Measure parse time and extraction counts on recorded fixtures"
+    )
+    parser.add_argument(
+        "--fixtures",
+        default=FIXTURES_DIR,
+        help="Directory recorded with movie_scraper.py --record",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Parses per page to average over"
+    )
+    parser.add_argument(
+        "--series",
+        nargs="*",
+        help="Only benchmark these series (e.g. TOHO UNITED)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["lxml", "html.parser", "html5lib"],
+        default=DEFAULT_BACKEND,
+        help="BeautifulSoup backend to benchmark",
+    )
+    parser.add_argument(
+        "--full-page",
+        action="store_true",
+        help="Parse the whole page instead of only each chain's schedule region",
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help=f"Also require output identical to a full-page {REFERENCE_BACKEND} parse",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with an error if a page parses to nothing or differs from its recording",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the hottest functions of the parse loop",
+    )
+    args = parser.parse_args()
+
+    fixtures = FixtureStore(args.fixtures)
+    if not fixtures.theaters():
+        logger.error(f"No fixtures found in {args.fixtures}")
+        sys.exit(1)
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    stats, failures = run_benchmark(
+        fixtures,
+        args.repeat,
+        args.series,
+        backend=args.backend,
+        strain=not args.full_page,
+        compare=args.compare,
+    )
+    if args.profile:
+        profiler.disable()
+
+    print(f"backend: {args.backend}, schedule region only: {not args.full_page}")
+    print_report(stats)
+    if args.profile:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+
+    for theater_name, reason in failures:
+        print(f"FAIL {theater_name}: {reason}")
+    if args.check and failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+from movie_entities import theater_schedules
+from schedule_model import ScreenType, Subtitle
+from theater_parsers import TheaterSeries, normalize_many, title_normalize
+
+logger = logging.getLogger(__name__)
+
+CORPUS_PATH = "scrape/title_corpus.json"
+SCHEDULES_GLOB = "data/movie_schedules_*.json"
+# How each series prints a title next to its format, written out by hand with
+# what it has to normalize to: (raw, title, subtitle, screen type), "{}"
+# standing for the bare title
+DECORATIONS = {
+    TheaterSeries.TJOY: (
+        ("{}", "{}", "", ""),
+        ("【字幕】{}", "{}", "字幕", ""),
+        ("【吹替】{}(G)", "{}(G)", "吹替", ""),
+        ("【IMAX・字幕】{}(PG12)", "{}", "字幕", "IMAX"),
+        ("【IMAXレーザー・字幕】{}", "{}", "字幕", "IMAXレーザー"),
+        ("【4DX・吹替】{}(PG12)", "{}", "吹替", "4DX"),
+        ("【DOLBY CINEMA・字幕】{}", "{}", "字幕", "DOLBY"),
+    ),
+    TheaterSeries.UNITED: (
+        ("{}", "{}", "", ""),
+        ("{}（字幕版）", "{}", "字幕", ""),
+        ("{}（吹替版）", "{}", "吹替", ""),
+        ("{}　IMAX（字幕版）", "{}", "字幕", "IMAX"),
+        ("{}　IMAXレーザー（字幕版）", "{}", "字幕", "IMAXレーザー"),
+        ("{}　4DX2D（吹替版）", "{}", "吹替", "4DX"),
+        ("{}　DOLBY（字幕版）", "{}", "字幕", "DOLBY"),
+    ),
+}
+DEFAULT_DECORATIONS = (
+    ("{}", "{}", "", ""),
+    ("{}（字幕版）", "{}(字幕版)", "字幕", ""),
+    ("{}（吹替版）", "{}(吹替版)", "吹替", ""),
+    ("{}（IMAX）", "{}(IMAX)", "", "IMAX"),
+)
+# Anything in a bare title that the rules or the markers would act on; such
+# titles can't be decorated without changing what they normalize to
+RULE_TEXT = ("（", "）", "(", "【", "字幕", "吹替", "4DX", "IMAX", "DOLBY", "BESTIA")
+
+
+def reference_title_normalize(title, theater_series):
+    """
+    The chain of checks title_normalize replaced, as the benchmark's baseline.
+    Its IMAX check comes before IMAXレーザー, which therefore never matches.
+    """
+    sub = Subtitle.ORIGINAL
+    if "字幕" in title:
+        sub = Subtitle.CAPTION
+    elif "吹替" in title:
+        sub = Subtitle.DUB
+
+    scrtype = ScreenType.NONE
+    if "4DX" in title:
+        scrtype = ScreenType.FOURDX
+    elif "IMAX" in title:
+        scrtype = ScreenType.IMAX
+    elif "IMAXレーザー" in title:
+        scrtype = ScreenType.IMAX_LASER
+    elif "DOLBY" in title:
+        scrtype = ScreenType.DOLBY
+    elif "BESTIA" in title:
+        scrtype = ScreenType.BESTIA
+
+    if theater_series == TheaterSeries.TJOY:
+        title = title.split("(PG")[0].strip()
+        title = re.sub(r"【.*?】", "", title).strip()
+    elif theater_series == TheaterSeries.UNITED:
+        title = title.split("（")[0].strip()
+        title = (
+            title.replace("IMAX", "").replace("4DX2D", "").replace("DOLBY", "").strip()
+        )
+    else:
+        title = title.replace("（", "(").replace("）", ")")
+
+    return (title, sub, scrtype)
+
+
+def schedule_titles(pattern=SCHEDULES_GLOB):
+    """The distinct titles of every scraped schedule file, in first-seen order"""
+    titles = {}
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        for record in records:
+            for _, movies in theater_schedules(record):
+                titles.update(dict.fromkeys(movie["title"] for movie in movies))
+    return list(titles)
+
+
+def plain_titles(titles):
+    """The titles the decorations can be put around"""
+    return [
+        title
+        for title in titles
+        if title == title.strip() and not any(text in title for text in RULE_TEXT)
+    ]
+
+
+def build_corpus(titles):
+    """
+    Every plain title in each series' decorations, with the result the
+    decoration says it must normalize to
+    """
+    return [
+        {
+            "series": series.name,
+            "raw": raw.format(title),
+            "title": expected.format(title),
+            "subtitle": subtitle,
+            "screen_type": screen_type,
+        }
+        for series in TheaterSeries
+        for raw, expected, subtitle, screen_type in DECORATIONS.get(
+            series, DEFAULT_DECORATIONS
+        )
+        for title in plain_titles(titles)
+    ]
+
+
+def write_corpus(path, corpus):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        # One entry per line keeps diffs of the corpus readable
+        f.write("[\n")
+        f.write(",\n".join(json.dumps(entry, ensure_ascii=False) for entry in corpus))
+        f.write("\n]\n")
+    os.replace(tmp_path, path)
+
+
+def load_corpus(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_corpus(corpus):
+    """[(entry, (title, subtitle, screen type))] of the entries normalized otherwise"""
+    failures = []
+    for entry in corpus:
+        title, subtitle, screen_type = title_normalize(
+            entry["raw"], TheaterSeries[entry["series"]]
+        )
+        found = (title, subtitle.value, screen_type.value)
+        if found != (entry["title"], entry["subtitle"], entry["screen_type"]):
+            failures.append((entry, found))
+    return failures
+
+
+def reference_changes(corpus):
+    """
+    [(entry, whether the reference contradicts the corpus)] of the entries
+    the reference normalizes otherwise than title_normalize. Those the
+    reference gets wrong are its IMAX check shadowing IMAXレーザー.
+    """
+    changed = []
+    for entry in corpus:
+        series = TheaterSeries[entry["series"]]
+        title, subtitle, screen_type = reference_title_normalize(entry["raw"], series)
+        if (title, subtitle, screen_type) == title_normalize(entry["raw"], series):
+            continue
+        found = (title, subtitle.value, screen_type.value)
+        expected = (entry["title"], entry["subtitle"], entry["screen_type"])
+        changed.append((entry, found != expected))
+    return changed
+
+
+def time_per_title(func, batches, repeat):
+    """Microseconds per title of func(titles, series) over every batch"""
+    titles = sum(len(titles) for _, titles in batches) * repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for series, batch in batches:
+            func(batch, series)
+    return (time.perf_counter() - start) * 1e6 / titles
+
+
+def run_benchmark(corpus, repeat):
+    """(label, microseconds per title) of each way of normalizing the corpus"""
+    batches = {}
+    for entry in corpus:
+        batches.setdefault(TheaterSeries[entry["series"]], []).append(entry["raw"])
+    batches = list(batches.items())
+    uncached = title_normalize.__wrapped__
+
+    def memoized(titles, series):
+        return [title_normalize(title, series) for title in titles]
+
+    # Every run starts cold, as a scrape run does; the later repeats of a run
+    # are the theaters of a chain that list the same titles
+    title_normalize.cache_clear()
+    results = [
+        (
+            "reference",
+            time_per_title(
+                lambda titles, series: [
+                    reference_title_normalize(title, series) for title in titles
+                ],
+                batches,
+                repeat,
+            ),
+        ),
+        (
+            "uncached",
+            time_per_title(
+                lambda titles, series: [uncached(title, series) for title in titles],
+                batches,
+                repeat,
+            ),
+        ),
+        ("memoized", time_per_title(memoized, batches, repeat)),
+    ]
+    title_normalize.cache_clear()
+    results.append(("batch", time_per_title(normalize_many, batches, repeat)))
+    return results
+
+
+def main():
+    """Check title normalization against its golden corpus and time it"""
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compare title normalization with the golden corpus of real titles "
+            "and measure its cost per title"
+        )
+    )
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="Golden title corpus")
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help=f"Rebuild the corpus from the titles in {SCHEDULES_GLOB}",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=50, help="Passes over the corpus to time"
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with an error if a title normalizes differently from the corpus",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    if args.update:
+        titles = schedule_titles()
+        if not titles:
+            logger.error(f"No titles found in {SCHEDULES_GLOB}")
+            sys.exit(1)
+        write_corpus(args.corpus, build_corpus(titles))
+        logger.info(f"Wrote {len(titles)} titles to {args.corpus}")
+    if not os.path.exists(args.corpus):
+        logger.error(f"No title corpus at {args.corpus}; build it with --update")
+        sys.exit(1)
+    corpus = load_corpus(args.corpus)
+
+    changed = reference_changes(corpus)
+    wrong = sum(1 for _, reference_wrong in changed if reference_wrong)
+    print(
+        f"{len(corpus)} titles, {len(changed)} normalized unlike the reference, "
+        f"{wrong} of them where the reference contradicts the corpus"
+    )
+    for entry, reference_wrong in changed:
+        if not reference_wrong:
+            print(f"CHANGED {entry['series']} {entry['raw']!r}")
+    print(f"{'engine':<10} {'us/title':>9}")
+    for label, micros in run_benchmark(corpus, args.repeat):
+        print(f"{label:<10} {micros:>9.2f}")
+
+    failures = check_corpus(corpus)
+    for entry, found in failures:
+        expected = (entry["title"], entry["subtitle"], entry["screen_type"])
+        print(f"FAIL {entry['series']} {entry['raw']!r}: {found} != {expected}")
+    if args.check and failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import logging
+import os
+from dataclasses import dataclass
+
+from selenium.webdriver.chrome.options import Options
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+CHROME_CACHE_DIR = "scrape/.chrome_cache"
+PAGE_LOAD_STRATEGIES = ("normal", "eager", "none")
+
+# Ads, analytics and tag managers on the chain sites; none of them render schedules
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "connect.facebook.net",
+    "analytics.twitter.com",
+    "static.ads-twitter.com",
+    "analytics.tiktok.com",
+    "bat.bing.com",
+    "clarity.ms",
+    "hotjar.com",
+    "criteo.com",
+    "criteo.net",
+    "scorecardresearch.com",
+    "yjtag.yahoo.co.jp",
+    "s.yimg.jp",
+    "b92.yahoo.co.jp",
+    "microad.jp",
+    "i-mobile.co.jp",
+    "ladsp.com",
+)
+# Images, fonts and media; the schedule is in the markup
+BLOCKED_EXTENSIONS = (
+    "png",
+    "jpg",
+    "jpeg",
+    "gif",
+    "webp",
+    "avif",
+    "svg",
+    "ico",
+    "woff",
+    "woff2",
+    "ttf",
+    "otf",
+    "mp4",
+    "webm",
+    "m3u8",
+    "mp3",
+)
+
+
+def blocked_url_patterns(hosts=BLOCKED_HOSTS, extensions=BLOCKED_EXTENSIONS):
+    """Wildcard patterns for CDP Network.setBlockedURLs"""
+    patterns = [f"*://*.{host}/*" for host in hosts]
+    patterns += [f"*://{host}/*" for host in hosts]
+    for extension in extensions:
+        patterns += [f"*.{extension}", f"*.{extension}?*"]
+    return patterns
+
+
+@dataclass
+class ChromeProfile:
+    """How each webdriver's Chrome is started"""
+
+    headless: bool = True
+    block_images: bool = True
+    # Requests Chrome drops before they are sent, matched with * wildcards
+    blocked_urls: tuple = tuple(blocked_url_patterns())
+    # "eager" hands the page over at DOMContentLoaded; load_page then waits
+    # for the schedule itself
+    page_load_strategy: str = "eager"
+    # Each driver of a pool caches under its own subdirectory, kept between runs
+    cache_dir: str = CHROME_CACHE_DIR
+    # Record network events, for measuring the bytes a page transfers
+    performance_log: bool = False
+
+
+# The profile the scraper used before it was tuned, for comparison; headless
+# still, so that it runs on machines without a display
+UNTUNED_PROFILE = ChromeProfile(
+    block_images=False, blocked_urls=(), page_load_strategy="normal", cache_dir=None
+)
+
+
+def chrome_options(profile, slot=0):
+    """Selenium options for a profile; `slot` picks the driver's cache directory"""
+    options = Options()
+    if profile.headless:
+        options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--mute-audio")
+    options.add_argument("--autoplay-policy=user-gesture-required")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-background-networking")
+    options.page_load_strategy = profile.page_load_strategy
+    if profile.block_images:
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_experimental_option(
+            "prefs", {"profile.managed_default_content_settings.images": 2}
+        )
+    if profile.cache_dir:
+        # Two Chrome processes must not share one cache directory
+        cache_dir = os.path.abspath(os.path.join(profile.cache_dir, str(slot)))
+        os.makedirs(cache_dir, exist_ok=True)
+        options.add_argument(f"--disk-cache-dir={cache_dir}")
+    if profile.performance_log:
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+
+def block_requests(driver, patterns):
+    """Have Chrome drop every request matching one of the patterns"""
+    if not patterns:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+    except Exception as e:
+        logger.warning(f"Could not block requests through CDP: {e}")
+
+
+def _proc_children(pid):
+    """Descendants of a process, read from /proc when psutil is not installed"""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # The command name is in parentheses and may contain spaces
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        parents.setdefault(int(fields[1]), []).append(int(entry))
+    descendants, stack = [], [pid]
+    while stack:
+        children = parents.get(stack.pop(), [])
+        descendants += children
+        stack += children
+    return descendants
+
+
+def _proc_rss(pid):
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of a process and all of its descendants"""
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            processes = [process] + process.children(recursive=True)
+        except psutil.Error:
+            return 0
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+    if not os.path.isdir("/proc"):
+        return 0
+    return sum(_proc_rss(child) for child in [pid] + _proc_children(pid))
+
+
+def driver_rss(driver):
+    """Resident memory of a webdriver's chromedriver and the Chrome it started"""
+    service = getattr(driver, "service", None)
+    process = getattr(service, "process", None)
+    if process is None:
+        return 0
+    return process_tree_rss(process.pid)
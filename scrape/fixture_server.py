@@ -0,0 +1,134 @@
+import argparse
+import hashlib
+import logging
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit
+
+from fixtures import FixtureStore
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = "scrape/fixtures"
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves the recorded pages of one series, with ETags and an optional delay"""
+
+    # Keep-alive, so pooled clients reuse their connections as with real sites
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; don't let Nagle delay the body
+    disable_nagle_algorithm = True
+
+    def __init__(self, pages, latency, *args, **kwargs):
+        self.pages = pages
+        self.latency = latency
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        html = self.pages.get(unquote(urlsplit(self.path).path))
+        if self.latency:
+            time.sleep(self.latency)
+        if html is None:
+            self.send_error(404)
+            return
+
+        etag = f'"{hashlib.sha1(html).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(html)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(html)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class _Server(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections from concurrent clients
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class FixtureServer:
+    """
+    Local stand-in for the chain sites, serving a FixtureStore over HTTP.
+    Each series gets its own port, so theaters of one chain share a host as
+    they do on the real sites. `latency` delays every response by that many
+    seconds to imitate the network.
+    """
+
+    def __init__(self, fixtures, latency=0.0, host="127.0.0.1"):
+        self.fixtures = fixtures
+        self.host = host
+        self._servers = {}
+        self._threads = []
+
+        pages = {}
+        for theater_name, entry in fixtures.theaters().items():
+            pages.setdefault(entry["series"], {})[f"/{entry['file']}"] = fixtures.load(
+                theater_name
+            )
+        for series, series_pages in pages.items():
+            handler = partial(FixtureHandler, series_pages, latency)
+            self._servers[series] = _Server((host, 0), handler)
+
+    def start(self):
+        for server in self._servers.values():
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        for server in self._servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def url(self, theater_name):
+        """The local URL of a recorded theater's page"""
+        entry = self.fixtures.entry(theater_name)
+        port = self._servers[entry["series"]].server_address[1]
+        return f"http://{self.host}:{port}/{quote(entry['file'])}"
+
+
+def main():
+    """Serve recorded fixtures until interrupted"""
+    parser = argparse.ArgumentParser(
+        description="Serve pages recorded with movie_scraper.py --record over HTTP"
+    )
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Fixture directory")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds to delay each response"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    with FixtureServer(FixtureStore(args.fixtures), args.latency) as server:
+        for theater_name in server.fixtures.theaters():
+            print(f"{server.url(theater_name)}  {theater_name}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
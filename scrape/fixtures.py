@@ -0,0 +1,92 @@
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+MANIFEST_NAME = "manifest.json"
+
+
+def fixture_slug(theater_name):
+    """Turn a theater name into a safe file name"""
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", theater_name).strip("_")
+
+
+class FixtureStore:
+    """
+    Directory of recorded schedule pages, one HTML file per theater.
+    manifest.json maps each theater_name to its page, source URL and series,
+    and a sibling .json file keeps the movies parsed when the page was recorded.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._manifest = self._load_manifest()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def theaters(self):
+        """Return the recorded theater names with their manifest entries"""
+        return dict(self._manifest)
+
+    def entry(self, theater_name):
+        return self._manifest.get(theater_name)
+
+    def load(self, theater_name):
+        """Return the recorded HTML of a theater, or None if it was never recorded"""
+        entry = self._manifest.get(theater_name)
+        if not entry:
+            return None
+        with open(os.path.join(self.directory, entry["file"]), "rb") as f:
+            return f.read()
+
+    def load_expected(self, theater_name):
+        """Return the movies parsed when the page was recorded"""
+        entry = self._manifest.get(theater_name)
+        if not entry:
+            return None
+        with open(
+            os.path.join(self.directory, entry["expected"]), "r", encoding="utf-8"
+        ) as f:
+            return json.load(f)
+
+    def save(self, theater_name, url, series, html, fetched_via, movies):
+        """Record a fetched page and what it parsed to"""
+        if isinstance(html, str):
+            html = html.encode("utf-8")
+        series_dir = series.name.lower()
+        slug = fixture_slug(theater_name)
+        entry = {
+            "file": f"{series_dir}/{slug}.html",
+            "expected": f"{series_dir}/{slug}.json",
+            "url": url,
+            "series": series.name,
+            "fetched_via": fetched_via,
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+        with self._lock:
+            os.makedirs(os.path.join(self.directory, series_dir), exist_ok=True)
+            with open(os.path.join(self.directory, entry["file"]), "wb") as f:
+                f.write(html)
+            with open(
+                os.path.join(self.directory, entry["expected"]), "w", encoding="utf-8"
+            ) as f:
+                json.dump(movies, f, ensure_ascii=False, indent=2)
+            self._manifest[theater_name] = entry
+            self._save_manifest()
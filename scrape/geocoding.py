@@ -0,0 +1,244 @@
+import asyncio
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+GEOCODE_CACHE_PATH = "scrape/geocode_cache.json"
+GEOCODE_CACHE_TTL_DAYS = 90
+# Queries that found nothing are retried sooner than found ones expire
+NOT_FOUND_TTL_DAYS = 7
+# Nominatim's usage policy allows at most one request per second
+GEOCODE_RATE = 1.0
+TRANSLATE_CONCURRENCY = 8
+
+Location = namedtuple("Location", ["address", "latitude", "longitude"])
+
+
+class TokenBucket:
+    """
+    Async rate limiter: up to `capacity` calls at once, refilled at `rate` per second.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        # Created on first use so it belongs to the running event loop
+        self._lock = None
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class GeocodeCache:
+    """
+    On-disk cache of geocoding results keyed by query string.
+    Queries that found nothing are cached too, with a shorter TTL.
+    """
+
+    def __init__(
+        self,
+        path=GEOCODE_CACHE_PATH,
+        ttl_days=GEOCODE_CACHE_TTL_DAYS,
+        not_found_ttl_days=NOT_FOUND_TTL_DAYS,
+    ):
+        self.path = path
+        self.ttl = timedelta(days=ttl_days)
+        self.not_found_ttl = timedelta(days=not_found_ttl_days)
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading geocode cache {self.path}: {e}")
+            return {}
+
+    def save(self):
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def found_age(self, query):
+        """How long ago a query was geocoded, or None if it isn't cached as found"""
+        with self._lock:
+            entry = self._entries.get(query)
+        if not entry or entry.get("latitude") is None:
+            return None
+        return datetime.now() - datetime.fromisoformat(entry["geocoded_at"])
+
+    def get(self, query):
+        """
+        Return (hit, location): hit is False on a miss or an expired entry,
+        and location is None when the query was cached as not found.
+        """
+        with self._lock:
+            entry = self._entries.get(query)
+        if not entry:
+            return False, None
+        found = entry.get("latitude") is not None
+        ttl = self.ttl if found else self.not_found_ttl
+        if datetime.now() - datetime.fromisoformat(entry["geocoded_at"]) > ttl:
+            return False, None
+        if not found:
+            return True, None
+        return True, Location(entry["address"], entry["latitude"], entry["longitude"])
+
+    def put(self, query, location):
+        with self._lock:
+            self._entries[query] = {
+                "address": location.address if location else None,
+                "latitude": location.latitude if location else None,
+                "longitude": location.longitude if location else None,
+                "geocoded_at": datetime.now().isoformat(timespec="seconds"),
+            }
+
+
+class StubGeocoder:
+    """
+    Offline stand-in for a geopy geocoder, answering from a dict of
+    query -> (address, latitude, longitude). Records every query it receives.
+    """
+
+    def __init__(self, locations):
+        self.locations = locations
+        self.queries = []
+
+    def geocode(self, query):
+        self.queries.append(query)
+        location = self.locations.get(query)
+        return Location(*location) if location else None
+
+
+class StubTranslator:
+    """Offline stand-in for googletrans.Translator using a dict of ja -> en"""
+
+    def __init__(self, translations):
+        self.translations = translations
+
+    async def translate(self, text, src="ja", dest="en"):
+        return namedtuple("Translated", ["text"])(self.translations.get(text, text))
+
+
+async def translate_names(translator, names, concurrency=TRANSLATE_CONCURRENCY):
+    """Translate theater names to English concurrently with one shared translator"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def translate(name):
+        async with semaphore:
+            try:
+                translation = translator.translate(name, src="ja", dest="en")
+                # Older googletrans releases translate synchronously
+                if inspect.isawaitable(translation):
+                    translation = await translation
+                return translation.text
+            except Exception as e:
+                logger.warning(f"Translation failed for {name}: {e}")
+                return name
+
+    return await asyncio.gather(*(translate(name) for name in names))
+
+
+async def geocode_query(geocoder, query, cache, bucket):
+    """Geocode one query through the cache, waiting for the rate limit on a miss"""
+    hit, location = cache.get(query)
+    if hit:
+        return location
+    await bucket.acquire()
+    loop = asyncio.get_running_loop()
+    try:
+        location = await loop.run_in_executor(None, geocoder.geocode, query)
+    except Exception as e:
+        logger.warning(f"Geocoding failed for {query}: {e}")
+        return None
+    cache.put(query, location)
+    return location
+
+
+def has_coordinates(row):
+    return bool(row.get("latitude")) and bool(row.get("longitude"))
+
+
+def is_stale(row, cache):
+    """
+    A row needs geocoding when it has no coordinates, or when the cache entry
+    its coordinates came from has expired.
+    """
+    if not has_coordinates(row):
+        return True
+    ages = [
+        cache.found_age(query)
+        for query in (row.get("theater_name_en"), row["theater_name"])
+        if query
+    ]
+    ages = [age for age in ages if age is not None]
+    # Coordinates that never went through the cache are kept as they are
+    return bool(ages) and min(ages) > cache.ttl
+
+
+async def geocode_rows(rows, geocoder, translator, cache, bucket=None):
+    """
+    Fill in theater_name_en, address and coordinates of the rows that are
+    missing them or whose cached geocode has expired.
+    Each name is tried in English first, then as written.
+    Returns the number of rows geocoded.
+    """
+    bucket = bucket or TokenBucket(GEOCODE_RATE)
+
+    untranslated = [row for row in rows if not row.get("theater_name_en")]
+    translations = await translate_names(
+        translator, [row["theater_name"] for row in untranslated]
+    )
+    for row, name_en in zip(untranslated, translations):
+        row["theater_name_en"] = name_en
+
+    # Requests to the geocoder are spaced out by the bucket; rows wait their turn
+    stale = [row for row in rows if is_stale(row, cache)]
+    geocoded = 0
+
+    async def geocode_row(row):
+        nonlocal geocoded
+        location = None
+        for query in dict.fromkeys((row["theater_name_en"], row["theater_name"])):
+            location = await geocode_query(geocoder, query, cache, bucket)
+            if location:
+                break
+        if location:
+            row["address"] = location.address
+            row["latitude"] = location.latitude
+            row["longitude"] = location.longitude
+            geocoded += 1
+        else:
+            logger.warning(f"No location found for {row['theater_name']}")
+
+    await asyncio.gather(*(geocode_row(row) for row in stale))
+    return geocoded
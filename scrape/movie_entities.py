@@ -0,0 +1,285 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import unicodedata
+
+from schedule_model import Movie
+from search_index import fold
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+ALIASES_PATH = "scrape/movie_aliases.json"
+
+# Screen formats, language versions and special screenings that chains add to a
+# title; matched after NFKC, case-insensitively, as whole words
+FORMAT_TOKENS = (
+    "IMAXレーザー",
+    "IMAXレーザーGT",
+    "IMAX",
+    "4DX2D",
+    "4DX3D",
+    "4DX",
+    "MX4D",
+    "ScreenX",
+    "ULTRA 4DX",
+    "DOLBY CINEMA",
+    "ドルビーシネマ",
+    "DOLBY ATMOS",
+    "ドルビーアトモス",
+    "DOLBY",
+    "BESTIA",
+    "TCX",
+    "2D",
+    "3D",
+    "4K",
+    "字幕版",
+    "吹替版",
+    "日本語字幕版",
+    "日本語字幕",
+    "字幕",
+    "吹替",
+    "極上爆音上映",
+    "極上音響上映",
+    "爆音上映",
+    "轟音上映",
+    "応援上映",
+    "発声可能上映",
+    "舞台挨拶中継",
+    "PG12",
+    "R15+",
+    "R18+",
+)
+# Longest first, so "IMAXレーザー" is removed whole rather than as "IMAX"
+_TOKEN = "|".join(
+    re.escape(token) for token in sorted(FORMAT_TOKENS, key=len, reverse=True)
+)
+_SEPARATORS = r"\s/・･|"
+FORMAT_PATTERN = re.compile(
+    rf"(?<![^{_SEPARATORS}【\[(])(?:{_TOKEN})(?![^{_SEPARATORS}】\])])",
+    re.IGNORECASE,
+)
+# 【IMAX・字幕】 and (2D/字幕版): brackets that hold nothing but format tokens
+FORMAT_BRACKETS = re.compile(
+    rf"[【\[(]\s*(?:(?:{_TOKEN})[{_SEPARATORS}]*)+\s*[】\])]", re.IGNORECASE
+)
+# "(上映時間: 151分)" and similar running-time notes
+RUNTIME_NOTE = re.compile(r"[(]\s*上映時間[^)]*[)]")
+
+
+def clean_title(title):
+    """A title without its format tokens, for display: NFKC, spaces collapsed"""
+    text = unicodedata.normalize("NFKC", title)
+    text = RUNTIME_NOTE.sub(" ", text)
+    text = FORMAT_BRACKETS.sub(" ", text)
+    text = FORMAT_PATTERN.sub(" ", text)
+    text = re.sub(r"\s+", " ", text).strip(f" {_SEPARATORS}")
+    # A title that is nothing but format words is kept as it was
+    return text or unicodedata.normalize("NFKC", title).strip()
+
+
+def canonical_key(title):
+    """The key variants of one film share: the cleaned title, folded"""
+    return fold(clean_title(title))
+
+
+def movie_id(key):
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+
+class AliasTable:
+    """
+    Persisted mapping of canonical title keys to movie ids.
+    A new key gets an id derived from it; editing the file to point several
+    keys at one id merges variants the rules can't tell apart, such as a film's
+    Japanese and English titles.
+    """
+
+    def __init__(self, path=ALIASES_PATH):
+        self.path = path
+        data = self._load()
+        self.aliases = data.get("aliases", {})
+        self.movies = data.get("movies", {})
+        self._changed = False
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading movie aliases {self.path}: {e}")
+            return {}
+
+    def save(self):
+        if not self._changed:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"aliases": self.aliases, "movies": self.movies},
+                f,
+                ensure_ascii=False,
+                indent=2,
+                sort_keys=True,
+            )
+        os.replace(tmp_path, self.path)
+        self._changed = False
+
+    def lookup(self, title):
+        """The movie id of a title, or None when it has never been resolved"""
+        return self.aliases.get(canonical_key(title))
+
+    def resolve(self, title):
+        """The movie id of a title, registering it when it is new"""
+        key = canonical_key(title)
+        found = self.aliases.get(key)
+        if found:
+            return found
+        found = movie_id(key)
+        self.aliases[key] = found
+        self.movies.setdefault(found, {"title": clean_title(title)})
+        self._changed = True
+        return found
+
+
+def theater_schedules(record):
+    """(date, movies) of a theater record, over all scraped dates"""
+    schedules = record.get("schedules")
+    if schedules:
+        return schedules.items()
+    return [(record.get("scrape_date"), record.get("movies") or [])]
+
+
+def build_movie_index(records, aliases):
+    """
+    The inverted index of movie id -> showings, each showing being
+    [theater id, date, start, end] with times serialized as in the schedules.
+    Theater ids are positions in `records`.
+    """
+    movies = {}
+    for theater_id, record in enumerate(records):
+        for date, day_movies in theater_schedules(record):
+            for movie in day_movies:
+                entity = movies.setdefault(
+                    aliases.resolve(movie["title"]), {"variants": [], "showings": []}
+                )
+                if movie["title"] not in entity["variants"]:
+                    entity["variants"].append(movie["title"])
+                for showtime in Movie.from_json(movie).showtimes:
+                    entity["showings"].append([theater_id, date, *showtime.to_json()])
+
+    for found, entity in movies.items():
+        entity["title"] = aliases.movies.get(found, {}).get("title", found)
+        entity["showings"].sort(key=lambda showing: (showing[1], showing[2]))
+    return {
+        "version": VERSION,
+        "theaters": [record["theater_name"] for record in records],
+        "movies": {found: movies[found] for found in sorted(movies)},
+    }
+
+
+def movie_index_path(schedule_path):
+    """data/movie_schedules_YYYYMMDD.json -> data/movie_schedules_YYYYMMDD.movies.json"""
+    return f"{os.path.splitext(schedule_path)[0]}.movies.json"
+
+
+def write_movie_index(path, records, aliases_path=ALIASES_PATH):
+    aliases = AliasTable(aliases_path)
+    index = build_movie_index(records, aliases)
+    aliases.save()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    variants = sum(len(entity["variants"]) for entity in index["movies"].values())
+    logger.info(
+        f"Resolved {variants} titles to {len(index['movies'])} movies to {path}"
+    )
+    return index
+
+
+class MovieIndex:
+    """Where one film is playing, looked up by title or movie id"""
+
+    def __init__(self, index, aliases=None):
+        self.theaters = index["theaters"]
+        self.movies = index["movies"]
+        self.aliases = aliases or AliasTable()
+        # Keys of titles seen in this index, for titles not yet in the alias table
+        self._keys = {
+            canonical_key(variant): found
+            for found, entity in self.movies.items()
+            for variant in entity["variants"]
+        }
+
+    @classmethod
+    def load(cls, path, aliases_path=ALIASES_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), AliasTable(aliases_path))
+
+    def resolve(self, title):
+        """The movie id of a title in any of its variants, or None"""
+        if title in self.movies:
+            return title
+        return self._keys.get(canonical_key(title)) or self.aliases.lookup(title)
+
+    def showings(self, title):
+        """[(theater_name, date, start, end)] of a film, in date and time order"""
+        entity = self.movies.get(self.resolve(title))
+        if not entity:
+            return []
+        return [
+            (self.theaters[theater_id], date, start, end)
+            for theater_id, date, start, end in entity["showings"]
+        ]
+
+
+def main():
+    """Resolve the titles of a schedule file to movies and write its movie index"""
+    parser = argparse.ArgumentParser(
+        description="Index which theaters show each movie, across title variants"
+    )
+    parser.add_argument("schedules", help="movie_schedules_YYYYMMDD.json to index")
+    parser.add_argument(
+        "--output", help="Index to write (default: next to the schedule file)"
+    )
+    parser.add_argument(
+        "--aliases", default=ALIASES_PATH, help="Persisted title alias table"
+    )
+    parser.add_argument("--movie", help="List the showings of a movie")
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    with open(args.schedules, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    if not records:
+        logger.error(f"No theaters in {args.schedules}")
+        sys.exit(1)
+
+    output = args.output or movie_index_path(args.schedules)
+    index = MovieIndex(
+        write_movie_index(output, records, args.aliases), AliasTable(args.aliases)
+    )
+    if args.movie:
+        found = index.resolve(args.movie)
+        if not found:
+            print(f"No movie matches {args.movie!r}")
+            return
+        print(f"{index.movies[found]['title']} ({found})")
+        for theater_name, date, start, end in index.showings(found):
+            print(f"  {date} {start}-{end or ''}  {theater_name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class NdjsonWriter:
+    """
+    Streams theater records to `<path>.part`, one JSON document per line,
+    flushing each one to disk as soon as it is written.
+    finalize() atomically renames the finished file to `path`.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.part_path = f"{path}.part"
+        # theater_name of every record already in the partial file
+        self.done = set()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if resume and os.path.exists(self.part_path):
+            self._recover()
+            self._file = open(self.part_path, "a", encoding="utf-8")
+            logger.info(f"Resuming {self.part_path} with {len(self.done)} theaters")
+        else:
+            self._file = open(self.part_path, "w", encoding="utf-8")
+
+    def _recover(self):
+        """Collect the finished records and cut off a line torn by a crash"""
+        good_size = 0
+        with open(self.part_path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                self.done.add(record["theater_name"])
+                good_size += len(line)
+        with open(self.part_path, "r+b") as f:
+            f.truncate(good_size)
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done.add(record["theater_name"])
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def finalize(self):
+        """Close the partial file and move it into place"""
+        self.close()
+        os.replace(self.part_path, self.path)
+        logger.info(f"Results saved to {self.path}")
+
+
+def read_ndjson(path):
+    """Yield the records of an NDJSON file one at a time"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def export_json(ndjson_path, json_path, order=None, compact=False):
+    """
+    Write the records of an NDJSON file as one JSON array, one record at a time.
+    Records are sorted by their position in `order` (a list of theater names),
+    with unknown theaters last. The default layout matches json.dump(indent=2).
+    """
+    # Index the line offsets so records can be copied in order without loading them all
+    offsets = []
+    with open(ndjson_path, "rb") as f:
+        offset = f.tell()
+        for line in iter(f.readline, b""):
+            if line.strip():
+                name = json.loads(line)["theater_name"]
+                offsets.append((name, offset))
+            offset = f.tell()
+
+    rank = {name: i for i, name in enumerate(order or [])}
+    offsets.sort(key=lambda item: rank.get(item[0], len(rank)))
+
+    tmp_path = f"{json_path}.tmp"
+    with open(ndjson_path, "rb") as src, open(tmp_path, "w", encoding="utf-8") as dst:
+        if not offsets:
+            dst.write("[]")
+        for i, (_, offset) in enumerate(offsets):
+            src.seek(offset)
+            record = json.loads(src.readline())
+            if compact:
+                text = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+                dst.write(("[" if i == 0 else ",") + text)
+            else:
+                text = json.dumps(record, ensure_ascii=False, indent=2)
+                dst.write("[\n" if i == 0 else ",\n")
+                dst.write("\n".join("  " + line for line in text.split("\n")))
+        if offsets:
+            dst.write("]" if compact else "\n]")
+    os.replace(tmp_path, json_path)
+    logger.info(f"Exported {len(offsets)} theaters to {json_path}")
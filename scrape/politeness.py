@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Requests in flight to one domain at a time
+PER_DOMAIN = 2
+# Seconds between the starts of two requests to the same domain
+MIN_INTERVAL = 0.5
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+# How often an async waiter checks for a free slot on a busy domain
+ASYNC_POLL = 0.05
+
+
+def domain_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+def is_throttle_status(status):
+    """429 and 5xx responses mean the site wants us to slow down"""
+    return status == 429 or (status is not None and status >= 500)
+
+
+def is_timeout(error):
+    # requests, Selenium and asyncio each have their own timeout exception
+    return isinstance(error, TimeoutError) or "Timeout" in type(error).__name__
+
+
+def interleave(items, key):
+    """Reorder items round-robin across their keys, keeping the order within a key"""
+    groups = defaultdict(deque)
+    for item in items:
+        groups[key(item)].append(item)
+    interleaved = []
+    while groups:
+        for group_key in list(groups):
+            interleaved.append(groups[group_key].popleft())
+            if not groups[group_key]:
+                del groups[group_key]
+    return interleaved
+
+
+class RequestOutcome:
+    """Filled in by the caller with the response status and Retry-After header"""
+
+    def __init__(self):
+        self.status = None
+        self.retry_after = None
+
+    def set_response(self, status, headers=None):
+        self.status = status
+        retry_after = (headers or {}).get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            self.retry_after = int(retry_after)
+
+
+class _Domain:
+    def __init__(self):
+        self.in_flight = 0
+        # Earliest time the next request may start
+        self.next_start = 0.0
+        self.failures = 0
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.backoff_seconds = 0.0
+
+
+class DomainScheduler:
+    """
+    Politeness budget per domain: at most `per_domain` requests in flight and
+    `min_interval` seconds between request starts. A 429, 5xx or timeout backs
+    the domain off exponentially, with jitter, and a success resets it.
+    Works from threads (request) and from an event loop (async_request).
+    """
+
+    def __init__(
+        self,
+        per_domain=PER_DOMAIN,
+        min_interval=MIN_INTERVAL,
+        base_backoff=BASE_BACKOFF,
+        max_backoff=MAX_BACKOFF,
+    ):
+        self.per_domain = per_domain
+        self.min_interval = min_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._domains = defaultdict(_Domain)
+        self._condition = threading.Condition()
+
+    def _try_acquire(self, domain):
+        """Take a slot on the domain; return 0, or how long to wait before retrying"""
+        state = self._domains[domain]
+        now = time.monotonic()
+        if state.in_flight >= self.per_domain:
+            return None
+        if now < state.next_start:
+            return state.next_start - now
+        state.in_flight += 1
+        state.next_start = now + self.min_interval
+        return 0
+
+    def _release(self, domain, elapsed, outcome, error):
+        with self._condition:
+            state = self._domains[domain]
+            state.in_flight -= 1
+            state.requests += 1
+            state.total_latency += elapsed
+            state.max_latency = max(state.max_latency, elapsed)
+            if error is not None or (outcome.status or 0) >= 400:
+                state.errors += 1
+
+            if is_throttle_status(outcome.status) or (error and is_timeout(error)):
+                state.throttled += 1
+                state.failures += 1
+                backoff = min(
+                    self.max_backoff, self.base_backoff * 2 ** (state.failures - 1)
+                )
+                backoff *= random.uniform(0.5, 1.5)
+                backoff = max(backoff, outcome.retry_after or 0)
+                state.backoff_seconds += backoff
+                state.next_start = max(state.next_start, time.monotonic() + backoff)
+                logger.warning(f"Backing off {domain} for {backoff:.1f}s")
+            elif error is None:
+                state.failures = 0
+            self._condition.notify_all()
+
+    @contextmanager
+    def request(self, url):
+        """Wait for a slot on the URL's domain, then hold it for one request"""
+        domain = domain_of(url)
+        with self._condition:
+            while True:
+                wait = self._try_acquire(domain)
+                if wait == 0:
+                    break
+                self._condition.wait(wait)
+
+        outcome = RequestOutcome()
+        start = time.monotonic()
+        error = None
+        try:
+            yield outcome
+        except BaseException as e:
+            # Cancellation and interrupts count as failed requests too
+            error = e
+            raise
+        finally:
+            self._release(domain, time.monotonic() - start, outcome, error)
+
+    @asynccontextmanager
+    async def async_request(self, url):
+        """The event-loop version of request()"""
+        domain = domain_of(url)
+        while True:
+            with self._condition:
+                wait = self._try_acquire(domain)
+            if wait == 0:
+                break
+            await asyncio.sleep(wait if wait is not None else ASYNC_POLL)
+
+        outcome = RequestOutcome()
+        start = time.monotonic()
+        error = None
+        try:
+            yield outcome
+        except BaseException as e:
+            # Cancellation and interrupts count as failed requests too
+            error = e
+            raise
+        finally:
+            self._release(domain, time.monotonic() - start, outcome, error)
+
+    def report(self):
+        """One line of request, error and latency statistics per domain"""
+        with self._condition:
+            domains = sorted(self._domains.items())
+        lines = []
+        for domain, state in domains:
+            if not state.requests:
+                continue
+            lines.append(
+                f"{domain}: {state.requests} requests, {state.errors} errors, "
+                f"{state.throttled} throttled, "
+                f"mean {state.total_latency / state.requests * 1000:.0f} ms, "
+                f"max {state.max_latency * 1000:.0f} ms, "
+                f"backed off {state.backoff_seconds:.1f}s"
+            )
+        return lines
+
+
+def polite_request(scheduler, url):
+    """scheduler.request(url), or a no-op context when politeness is off"""
+    if scheduler is None:
+        return nullcontext(RequestOutcome())
+    return scheduler.request(url)
+
+
+@asynccontextmanager
+async def _unlimited_async():
+    yield RequestOutcome()
+
+
+def polite_request_async(scheduler, url):
+    """The event-loop version of polite_request()"""
+    if scheduler is None:
+        return _unlimited_async()
+    return scheduler.async_request(url)
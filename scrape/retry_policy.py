@@ -0,0 +1,108 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+from selenium.common.exceptions import WebDriverException
+
+from politeness import is_throttle_status, is_timeout
+from theater_parsers import TheaterSeries
+
+logger = logging.getLogger(__name__)
+
+RETRIES = 1
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 10.0
+# Consecutive failed theaters before a chain is skipped for the rest of the run
+BREAKER_THRESHOLD = 3
+# Series that are not one site: OTHER gathers unrelated independent theaters,
+# so failures of some say nothing about the rest
+UNBROKEN_SERIES = (TheaterSeries.OTHER,)
+
+
+class TransientError(Exception):
+    """A failure that may go away when the same request is made again"""
+
+
+def is_transient(error):
+    """Timeouts, dropped connections, 429/5xx responses and browser errors"""
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        return response is not None and is_throttle_status(response.status_code)
+    transient_types = (TransientError, requests.ConnectionError, WebDriverException)
+    return isinstance(error, transient_types) or is_timeout(error)
+
+
+class RetryPolicy:
+    """
+    Retry a call on transient errors, up to `retries` more times, waiting an
+    exponentially growing, jittered delay between attempts. Any other error
+    is raised at once.
+    """
+
+    def __init__(self, retries=RETRIES, delay=RETRY_DELAY, max_delay=MAX_RETRY_DELAY):
+        self.retries = retries
+        self.delay = delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        """Seconds to wait before retry number `attempt`, counting from 1"""
+        delay = min(self.max_delay, self.delay * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.5)
+
+    def call(self, func, *args, description="call"):
+        for attempt in range(1, self.retries + 2):
+            try:
+                return func(*args)
+            except Exception as e:
+                if attempt > self.retries or not is_transient(e):
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(
+                    f"Retrying {description} in {delay:.1f}s "
+                    f"({attempt}/{self.retries}): {e}"
+                )
+                time.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive failed theaters per series. Once a series reaches
+    `threshold` it is left open: the rest of its theaters are not tried again
+    in this run. A success closes the count again. Series in `exempt` are
+    never counted.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, exempt=UNBROKEN_SERIES):
+        self.threshold = threshold
+        self.exempt = frozenset(exempt)
+        self._lock = threading.Lock()
+        self._failures = {}
+
+    def allow(self, series):
+        with self._lock:
+            return self._failures.get(series, 0) < self.threshold
+
+    def record(self, series, succeeded):
+        if series in self.exempt:
+            return
+        with self._lock:
+            if succeeded:
+                self._failures[series] = 0
+                return
+            failures = self._failures.get(series, 0) + 1
+            self._failures[series] = failures
+        if failures == self.threshold:
+            logger.warning(
+                f"Giving up on {series.name} for this run after {failures} "
+                "failed theaters in a row"
+            )
+
+    def open_series(self):
+        with self._lock:
+            return sorted(
+                series.name
+                for series, failures in self._failures.items()
+                if failures >= self.threshold
+            )
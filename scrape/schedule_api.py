@@ -0,0 +1,473 @@
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache, partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from movie_entities import (
+    ALIASES_PATH,
+    AliasTable,
+    MovieIndex,
+    build_movie_index,
+    theater_schedules,
+)
+from schedule_store import THEATER_FIELDS
+from scrape_state import latest_schedule_path
+from search_index import SearchIndex, build_index
+from spatial_index import SpatialIndex
+from starting_soon import has_location
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = "data"
+HOST = "127.0.0.1"
+PORT = 8000
+# Seconds between checks for a new schedule file
+RELOAD_INTERVAL = 5.0
+# Clients reuse a response this long, then revalidate it with its ETag
+CACHE_MAX_AGE = 300
+NEAREST_K = 5
+MAX_NEAREST_K = 50
+# Search radius of a nearest query, by default and at most, in km
+NEAREST_MAX_KM = 30.0
+MAX_NEAREST_KM = 100.0
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# Encoded answers to distinct nearest and search queries kept per snapshot
+QUERY_CACHE_SIZE = 1024
+# Bodies shorter than this are not worth a content coding
+MIN_COMPRESS_BYTES = 256
+# Preferred content codings, best first
+CODINGS = ("br", "gzip")
+
+
+def accepted_codings(header):
+    """The content codings an Accept-Encoding header allows, i.e. with q > 0"""
+    codings = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip() and quality > 0:
+            codings.add(coding.strip().lower())
+    return codings
+
+
+class Response:
+    """
+    One JSON document, encoded up front in each content coding that makes it
+    smaller. A strong ETag stands for exact bytes, so every coding has its own.
+    `fast` trades compression ratio for time, for answers computed per query.
+    """
+
+    __slots__ = ("status", "bodies", "etags")
+
+    def __init__(self, document, status=200, fast=False):
+        body = json.dumps(document, ensure_ascii=False, separators=(",", ":"))
+        body = body.encode("utf-8")
+        self.status = status
+        self.bodies = {"identity": body}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            encoded = {"gzip": gzip.compress(body, 6 if fast else 9, mtime=0)}
+            if brotli is not None:
+                encoded["br"] = brotli.compress(body, quality=5 if fast else 11)
+            self.bodies.update(
+                (coding, data)
+                for coding, data in encoded.items()
+                if len(data) < len(body)
+            )
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etags = {
+            coding: f'"{digest}"' if coding == "identity" else f'"{digest}-{coding}"'
+            for coding in self.bodies
+        }
+
+    def coding_for(self, accept_encoding):
+        accepted = accepted_codings(accept_encoding)
+        for coding in CODINGS:
+            if coding in self.bodies and (coding in accepted or "*" in accepted):
+                return coding
+        return "identity"
+
+
+NOT_FOUND = Response({"error": "not found"}, 404)
+UNAVAILABLE = Response({"error": "no schedules published yet"}, 503)
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match compares weakly: a W/ prefix does not matter"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in (
+        tag[2:] if tag.startswith("W/") else tag for tag in candidates
+    )
+
+
+def query_value(query, name, convert, default=None, required=False):
+    values = query.get(name)
+    if not values or not values[0].strip():
+        if required:
+            raise ValueError(f"{name} is required")
+        return default
+    try:
+        value = convert(values[0].strip())
+    except ValueError:
+        raise ValueError(f"{name} must be a number") from None
+    # float() also reads "inf" and "nan"
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return value
+
+
+def theater_summary(theater_id, record):
+    summary = {"id": theater_id}
+    summary.update((field, record.get(field)) for field in THEATER_FIELDS)
+    if record.get("stale"):
+        summary["stale"] = True
+    return summary
+
+
+class Snapshot:
+    """
+    Every response for one schedule file. The documents of theaters and
+    movies are encoded when the file is published; nearest-theater and
+    search answers are computed from indexes built at the same time and
+    encoded once per distinct query.
+    """
+
+    def __init__(self, path, records, aliases_path=ALIASES_PATH):
+        self.path = path
+        started = time.perf_counter()
+        theaters = [
+            theater_summary(theater_id, record)
+            for theater_id, record in enumerate(records)
+        ]
+        self.theater_ids = {
+            theater["theater_name"]: theater["id"] for theater in theaters
+        }
+        self.spatial = SpatialIndex([t for t in theaters if has_location(t)])
+        self.search = SearchIndex(build_index(records))
+        aliases = AliasTable(aliases_path)
+        movie_index = build_movie_index(records, aliases)
+        self.movies = MovieIndex(movie_index, aliases)
+
+        responses = {
+            "/api/status": Response(
+                {
+                    "schedules": os.path.basename(path),
+                    "published": datetime.now().isoformat(timespec="seconds"),
+                    "theaters": len(records),
+                    "movies": len(movie_index["movies"]),
+                }
+            ),
+            "/api/theaters": Response(theaters),
+        }
+        for theater_id, record in enumerate(records):
+            responses[f"/api/theaters/{theater_id}"] = Response(
+                {
+                    **theaters[theater_id],
+                    "schedules": dict(theater_schedules(record)),
+                }
+            )
+        for movie_id, entity in movie_index["movies"].items():
+            responses[f"/api/movies/{movie_id}"] = Response(
+                {
+                    "id": movie_id,
+                    "title": entity["title"],
+                    "variants": entity["variants"],
+                    "showings": [
+                        {
+                            "theater_id": theater_id,
+                            "theater_name": movie_index["theaters"][theater_id],
+                            "date": date,
+                            "start": start,
+                            "end": end,
+                        }
+                        for theater_id, date, start, end in entity["showings"]
+                    ],
+                }
+            )
+        self.responses = responses
+        self.nearest = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._nearest)
+        self.search_movies = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._search_movies)
+
+        codings = [c for c in CODINGS if c != "br" or brotli is not None]
+        sizes = {coding: 0 for coding in ("identity", *codings)}
+        for response in responses.values():
+            for coding in sizes:
+                body = response.bodies.get(coding, response.bodies["identity"])
+                sizes[coding] += len(body)
+        logger.info(
+            f"Published {len(responses)} responses for {path} in "
+            f"{time.perf_counter() - started:.1f}s: "
+            + ", ".join(
+                f"{coding} {size / 1024:.0f} KB" for coding, size in sizes.items()
+            )
+        )
+
+    @classmethod
+    def load(cls, path, aliases_path=ALIASES_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(path, json.load(f), aliases_path)
+
+    def _nearest(self, lat, lon, k, max_km):
+        found = self.spatial.nearest(lat, lon, k, max_km)
+        return Response(
+            [
+                {**theater, "distance_km": round(distance, 3)}
+                for distance, theater in found
+            ],
+            fast=True,
+        )
+
+    def _search_movies(self, text, limit):
+        # Hits come best first, one per raw title; several variants of one
+        # movie collapse into its best-ranked hit before the limit applies
+        movies = {}
+        for title, theater_names in self.search.search_movies(text):
+            movie_id = self.movies.resolve(title)
+            movie = movies.setdefault(
+                movie_id,
+                {
+                    "id": movie_id,
+                    "title": self.movies.movies[movie_id]["title"],
+                    "theaters": {},
+                },
+            )
+            for name in theater_names:
+                movie["theaters"].setdefault(
+                    name, {"id": self.theater_ids[name], "theater_name": name}
+                )
+        return Response(
+            [
+                {**movie, "theaters": list(movie["theaters"].values())}
+                for movie in list(movies.values())[:limit]
+            ],
+            fast=True,
+        )
+
+    def respond(self, path, query):
+        """The Response for a request path, or None; bad parameters raise ValueError"""
+        if path == "/api/theaters/nearest":
+            # Points are rounded to about 100 m so that nearby users share answers
+            lat = round(query_value(query, "lat", float, required=True), 3)
+            lon = round(query_value(query, "lon", float, required=True), 3)
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError("lat and lon must be a point on the map")
+            k = query_value(query, "k", int, NEAREST_K)
+            max_km = query_value(query, "max_km", float, NEAREST_MAX_KM)
+            if max_km <= 0:
+                raise ValueError("max_km must be positive")
+            max_km = min(max_km, MAX_NEAREST_KM)
+            return self.nearest(lat, lon, min(max(k, 1), MAX_NEAREST_K), max_km)
+        if path == "/api/movies":
+            text = query_value(query, "q", str, required=True)
+            limit = query_value(query, "limit", int, SEARCH_LIMIT)
+            return self.search_movies(text, min(max(limit, 1), MAX_SEARCH_LIMIT))
+        return self.responses.get(path)
+
+
+class Publisher:
+    """
+    Keeps the Snapshot of the newest schedule file in a directory, or of
+    one fixed file, and publishes the next one from a thread once it lands.
+    A snapshot is complete before it replaces the previous one, so every
+    request is answered wholly from the old file or wholly from the new one.
+    """
+
+    def __init__(
+        self,
+        data_dir=DATA_DIR,
+        path=None,
+        aliases_path=ALIASES_PATH,
+        interval=RELOAD_INTERVAL,
+    ):
+        self.data_dir = data_dir
+        self.path = path
+        self.aliases_path = aliases_path
+        self.interval = interval
+        self.snapshot = None
+        self._signature = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+
+    def refresh(self):
+        """Publish the schedule file if it changed; returns whether it did"""
+        path = self.path or latest_schedule_path(self.data_dir)
+        if not path:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        signature = (path, stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return False
+        # Whatever happens, this version of the file is not tried again
+        self._signature = signature
+        try:
+            snapshot = Snapshot.load(path, self.aliases_path)
+        except Exception as e:
+            logger.error(f"Error publishing {path}, still serving the last one: {e}")
+            return False
+        self.snapshot = snapshot
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def start(self):
+        self.refresh()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Serves the published Snapshot, negotiating the content coding"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def __init__(self, publisher, *args, **kwargs):
+        self.publisher = publisher
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        self.respond()
+
+    def do_HEAD(self):
+        self.respond(head=True)
+
+    def lookup(self):
+        parts = urlsplit(self.path)
+        # One read, so a reload in the middle of a request can't mix snapshots
+        snapshot = self.publisher.snapshot
+        if snapshot is None:
+            return UNAVAILABLE
+        try:
+            response = snapshot.respond(
+                unquote(parts.path).rstrip("/"), parse_qs(parts.query)
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, 400)
+        return response or NOT_FOUND
+
+    def respond(self, head=False):
+        response = self.lookup()
+        coding = response.coding_for(self.headers.get("Accept-Encoding"))
+        etag = response.etags[coding]
+        cacheable = response.status == 200
+        if cacheable and etag_matches(self.headers.get("If-None-Match"), etag):
+            self.send_response(304)
+            self.send_cache_headers(etag)
+            self.end_headers()
+            return
+
+        body = response.bodies[coding]
+        self.send_response(response.status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if coding != "identity":
+            self.send_header("Content-Encoding", coding)
+        if cacheable:
+            self.send_cache_headers(etag)
+        else:
+            self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def send_cache_headers(self, etag):
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", f"public, max-age={CACHE_MAX_AGE}")
+        self.send_header("Vary", "Accept-Encoding")
+
+    def end_headers(self):
+        # The webapp's dev server runs on another port
+        self.send_header("Access-Control-Allow-Origin", "*")
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def main():
+    """Serve the newest schedule file over HTTP until interrupted"""
+    parser = argparse.ArgumentParser(
+        description=(
+            "Local API over the scraped schedules: nearest theaters, movie "
+            "search and per-theater schedules"
+        )
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=DATA_DIR,
+        help="Directory whose newest movie_schedules_YYYYMMDD.json is served",
+    )
+    parser.add_argument(
+        "--schedules", help="Serve this schedule file instead, without reloading"
+    )
+    parser.add_argument(
+        "--aliases", default=ALIASES_PATH, help="Persisted title alias table"
+    )
+    parser.add_argument("--host", default=HOST, help="Address to listen on")
+    parser.add_argument("--port", type=int, default=PORT, help="Port to listen on")
+    parser.add_argument(
+        "--reload-interval",
+        type=float,
+        default=RELOAD_INTERVAL,
+        help="Seconds between checks for a new schedule file",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    if brotli is None:
+        logger.info("brotli is not installed; serving gzip only")
+
+    publisher = Publisher(
+        args.data_dir, args.schedules, args.aliases, args.reload_interval
+    ).start()
+    server = _Server((args.host, args.port), partial(ApiHandler, publisher))
+    logger.info(f"Serving on http://{args.host}:{server.server_address[1]}/api/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        publisher.stop()
+
+
+if __name__ == "__main__":
+    main()
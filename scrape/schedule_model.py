@@ -0,0 +1,185 @@
+import re
+from bisect import bisect_left
+from datetime import timedelta
+from enum import Enum
+
+# Screenings are listed per business day, which runs from 05:00 until the last
+# late show; a "01:10" start belongs to the evening before, like "25:10"
+BUSINESS_DAY_START = 5 * 60
+MINUTES_PER_DAY = 24 * 60
+
+TIME_PATTERN = re.compile(r"(\d{1,2})[:：](\d{2})")
+
+
+class Subtitle(Enum):
+    ORIGINAL = ""
+    CAPTION = "字幕"
+    DUB = "吹替"
+
+
+class ScreenType(Enum):
+    NONE = ""
+    FOURDX = "4DX"
+    IMAX = "IMAX"
+    IMAX_LASER = "IMAXレーザー"
+    DOLBY = "DOLBY"
+    BESTIA = "BESTIA"
+
+
+def parse_time(text):
+    """
+    Minutes from the business-day start of an "HH:MM" time, or None.
+    Times before the start, such as "01:10", and times past 24:00 such as
+    "25:10" both count as late on the same business day.
+    """
+    if not text:
+        return None
+    match = TIME_PATTERN.fullmatch(text.strip())
+    if not match:
+        return None
+    minutes = int(match.group(1)) * 60 + int(match.group(2))
+    if minutes < BUSINESS_DAY_START:
+        minutes += MINUTES_PER_DAY
+    return minutes - BUSINESS_DAY_START
+
+
+def format_time(minutes):
+    """
+    The wall-clock "HH:MM" of a business-day offset, as theaters print it:
+    a late show is "01:10", which parse_time reads back as the same offset
+    """
+    if minutes is None:
+        return None
+    minutes = (minutes + BUSINESS_DAY_START) % MINUTES_PER_DAY
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def business_time(moment):
+    """(date, minutes from the business-day start) of a datetime"""
+    shifted = moment - timedelta(minutes=BUSINESS_DAY_START)
+    return shifted.date(), shifted.hour * 60 + shifted.minute
+
+
+class Showtime:
+    """One screening, as minutes from the business-day start; end may be unknown"""
+
+    __slots__ = ("start", "end")
+
+    def __init__(self, start, end=None):
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def parse(cls, start_text, end_text=None):
+        """A showtime from "HH:MM" strings, or None when the start is not a time"""
+        start = parse_time(start_text)
+        if start is None:
+            return None
+        end = parse_time(end_text)
+        # An end listed as "00:10" after a "22:00" start was already moved past
+        # midnight by parse_time; anything else before the start is bogus
+        if end is not None and end < start:
+            end = None
+        return cls(start, end)
+
+    @classmethod
+    def from_text(cls, text):
+        """A showtime from free text such as "10:00～12:05", or None"""
+        times = TIME_PATTERN.findall(text or "")
+        if not times:
+            return None
+        return cls.parse(*(f"{hours}:{minutes}" for hours, minutes in times[:2]))
+
+    @classmethod
+    def from_json(cls, value):
+        """Read a serialized showtime, or the bare "HH:MM" strings of older files"""
+        if isinstance(value, str):
+            return cls.from_text(value)
+        return cls.parse(*value[:2])
+
+    def to_json(self):
+        return [format_time(self.start), format_time(self.end)]
+
+    @property
+    def duration(self):
+        return None if self.end is None else self.end - self.start
+
+    def overlaps(self, other):
+        """Whether two screenings with known ends run at the same time"""
+        if self.end is None or other.end is None:
+            return False
+        return self.start < other.end and other.start < self.end
+
+    def _key(self):
+        return (self.start, -1 if self.end is None else self.end)
+
+    def __eq__(self, other):
+        if not isinstance(other, Showtime):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __lt__(self, other):
+        return self._key() < other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"Showtime({format_time(self.start)!r}, {format_time(self.end)!r})"
+
+
+class Movie:
+    """
+    A title's screenings at one theater on one day, sorted by start.
+    subtitle and screen_type are None for chains whose pages don't state them.
+    """
+
+    __slots__ = ("title", "subtitle", "screen_type", "showtimes", "_starts")
+
+    def __init__(self, title, showtimes=(), subtitle=None, screen_type=None):
+        self.title = title
+        self.subtitle = subtitle
+        self.screen_type = screen_type
+        self.showtimes = sorted(showtimes)
+        self._starts = [showtime.start for showtime in self.showtimes]
+
+    @classmethod
+    def from_json(cls, record):
+        showtimes = (Showtime.from_json(value) for value in record.get("showtimes", []))
+        subtitle = record.get("subtitle")
+        screen_type = record.get("screen_type")
+        return cls(
+            record["title"],
+            [showtime for showtime in showtimes if showtime is not None],
+            None if subtitle is None else Subtitle(subtitle),
+            None if screen_type is None else ScreenType(screen_type),
+        )
+
+    def to_json(self):
+        record = {"title": self.title}
+        if self.subtitle is not None:
+            record["subtitle"] = self.subtitle.value
+        if self.screen_type is not None:
+            record["screen_type"] = self.screen_type.value
+        record["showtimes"] = [showtime.to_json() for showtime in self.showtimes]
+        return record
+
+    def starting_after(self, minutes):
+        """The showtimes starting at or after a business-day offset"""
+        return self.showtimes[bisect_left(self._starts, minutes) :]
+
+    def __eq__(self, other):
+        if not isinstance(other, Movie):
+            return NotImplemented
+        return self.to_json() == other.to_json()
+
+    def __repr__(self):
+        return f"Movie({self.title!r}, {len(self.showtimes)} showtimes)"
+
+
+def movies_from_json(records):
+    return [Movie.from_json(record) for record in records or []]
+
+
+def movies_to_json(movies):
+    return [movie.to_json() for movie in movies or []]
@@ -0,0 +1,474 @@
+import argparse
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+
+from schedule_model import format_time, parse_time
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TCSCHED1"
+VERSION = 3
+# Version 1 files have no OPEN_END showtimes and read the same way
+READABLE_VERSIONS = (1, 2, 3)
+# Versions before this one store minutes after midnight instead of offsets from
+# the business-day start
+BUSINESS_DAY_VERSION = 3
+OUTPUT_PATH = "data/movie_schedules.tcs"
+# Packed arrays are stored little-endian, each starting on a 4-byte boundary
+ALIGNMENT = 4
+
+# Index stored for subtitle/screen_type when a movie record has no such field
+ABSENT = 0xFFFF
+# Showtimes are packed as schedule_model offsets from the business-day start
+# End minute of a showtime scraped as a bare "HH:MM" string rather than a pair
+NO_END = -1
+# End minute of a [start, null] showtime, whose end time was not listed
+OPEN_END = -3
+# Start minute of a showtime that doesn't fit the packed form; the original value
+# is kept in the partition's raw_showtimes
+RAW = -2
+
+MOVIE_FIELDS = ("title", "subtitle", "screen_type", "showtimes")
+THEATER_FIELDS = ("theater_name", "theater_name_en", "address", "latitude", "longitude")
+
+# name -> typecode of the packed per-partition arrays
+ROW_ARRAYS = (
+    ("theater", "H"),
+    ("title", "I"),
+    ("subtitle", "H"),
+    ("screen_type", "H"),
+)
+SHOWTIME_ARRAYS = (("start", "h"), ("end", "h"))
+
+
+def time_to_offset(text):
+    """
+    Return the business-day offset of "HH:MM", or None if format_time() wouldn't
+    give the same text back (e.g. "25:10", which is stored verbatim instead)
+    """
+    if not isinstance(text, str):
+        return None
+    offset = parse_time(text)
+    if offset is None or format_time(offset) != text:
+        return None
+    return offset
+
+
+def minutes_to_time(minutes):
+    """Format the minutes after midnight that version 1 and 2 stores hold"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def snapshot_name(path):
+    """Name a snapshot after the date in movie_schedules_YYYYMMDD.json"""
+    match = re.search(r"movie_schedules_(\d{8})", os.path.basename(path))
+    return match.group(1) if match else os.path.splitext(os.path.basename(path))[0]
+
+
+class _Interner:
+    """Assigns a stable index to each distinct value"""
+
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def __call__(self, value):
+        key = json.dumps(value, ensure_ascii=False)
+        if key not in self._index:
+            self._index[key] = len(self.values)
+            self.values.append(value)
+        return self._index[key]
+
+
+class _PartitionBuilder:
+    def __init__(self, snapshot, date):
+        self.snapshot = snapshot
+        self.date = date
+        self.theaters = {}
+        # Values that don't fit the arrays, keyed by showtime or row index
+        self.raw_showtimes = {}
+        self.movie_extras = {}
+        self.arrays = {name: array(code) for name, code in ROW_ARRAYS}
+        self.arrays["showtime_offsets"] = array("I", [0])
+        self.arrays.update({name: array(code) for name, code in SHOWTIME_ARRAYS})
+
+
+def _encode_showtime(showtime):
+    """Return (start, end) offsets, or None if the value must be stored verbatim"""
+    if isinstance(showtime, str):
+        start = time_to_offset(showtime)
+        return None if start is None else (start, NO_END)
+    if isinstance(showtime, list) and len(showtime) == 2:
+        start, end = (time_to_offset(value) for value in showtime)
+        if start is not None and showtime[1] is None:
+            return start, OPEN_END
+        if start is not None and end is not None:
+            return start, end
+    return None
+
+
+def build_store(snapshots):
+    """
+    Pack snapshots into the columnar layout.
+    `snapshots` is a list of (name, records loaded from movie_schedules_*.json).
+    Returns (header dict, partition builders).
+    """
+    theater_table = _Interner()
+    titles = _Interner()
+    labels = _Interner()
+    partitions = {}
+    header_snapshots = []
+
+    def partition(snapshot, date):
+        key = (snapshot, date)
+        if key not in partitions:
+            partitions[key] = _PartitionBuilder(snapshot, date)
+        return partitions[key]
+
+    def add_movies(part, theater_index, movies):
+        arrays = part.arrays
+        first_row = len(arrays["theater"])
+        for movie in movies:
+            arrays["theater"].append(theater_index)
+            arrays["title"].append(titles(movie["title"]))
+            for name in ("subtitle", "screen_type"):
+                arrays[name].append(labels(movie[name]) if name in movie else ABSENT)
+            extra = {k: v for k, v in movie.items() if k not in MOVIE_FIELDS}
+            if extra:
+                part.movie_extras[str(len(arrays["theater"]) - 1)] = extra
+            for showtime in movie.get("showtimes", []):
+                encoded = _encode_showtime(showtime)
+                if encoded is None:
+                    part.raw_showtimes[str(len(arrays["start"]))] = showtime
+                    encoded = (RAW, NO_END)
+                arrays["start"].append(encoded[0])
+                arrays["end"].append(encoded[1])
+            arrays["showtime_offsets"].append(len(arrays["start"]))
+        part.theaters[theater_index] = [first_row, len(arrays["theater"])]
+
+    for name, records in snapshots:
+        entries = []
+        seen = set()
+        for record in records:
+            theater_index = theater_table([record.get(f) for f in THEATER_FIELDS])
+            # Each partition maps a theater to one run of rows
+            if theater_index in seen:
+                raise ValueError(
+                    f"{record['theater_name']} appears more than once in snapshot {name}"
+                )
+            seen.add(theater_index)
+            scrape_date = record["scrape_date"]
+            schedules = record.get("schedules")
+            if schedules is not None and schedules.get(scrape_date, []) != record.get(
+                "movies"
+            ):
+                raise ValueError(
+                    f"{record['theater_name']}: movies differ from "
+                    f"schedules[{scrape_date}] and can't share a partition"
+                )
+            add_movies(partition(name, scrape_date), theater_index, record["movies"])
+            for date, movies in (schedules or {}).items():
+                if date != scrape_date:
+                    add_movies(partition(name, date), theater_index, movies)
+
+            entry = {
+                "theater": theater_index,
+                "scrape_date": scrape_date,
+                "fields": [f for f in THEATER_FIELDS if f in record],
+            }
+            if schedules is not None:
+                entry["schedules"] = list(schedules)
+            extra = {
+                k: v
+                for k, v in record.items()
+                if k not in THEATER_FIELDS
+                and k not in ("movies", "scrape_date", "schedules")
+            }
+            if extra:
+                entry["extra"] = extra
+            entries.append(entry)
+        header_snapshots.append({"name": name, "theaters": entries})
+
+    header = {
+        "version": VERSION,
+        "theaters": theater_table.values,
+        "titles": titles.values,
+        "labels": labels.values,
+        "snapshots": header_snapshots,
+    }
+    return header, list(partitions.values())
+
+
+def write_store(path, snapshots):
+    """Write snapshots as a columnar store; returns the number of bytes written"""
+    header, partitions = build_store(snapshots)
+
+    # Lay the arrays out after the header, recording where each one starts
+    blobs = []
+    offset = 0
+    header["partitions"] = []
+    for part in partitions:
+        layout = {}
+        for name, values in part.arrays.items():
+            if sys.byteorder != "little":
+                values = array(values.typecode, values)
+                values.byteswap()
+            data = values.tobytes()
+            layout[name] = [offset, len(values)]
+            blobs.append(data)
+            padding = -len(data) % ALIGNMENT
+            blobs.append(b"\0" * padding)
+            offset += len(data) + padding
+        header["partitions"].append(
+            {
+                "snapshot": part.snapshot,
+                "date": part.date,
+                "theaters": {str(k): v for k, v in part.theaters.items()},
+                "raw_showtimes": part.raw_showtimes,
+                "movie_extras": part.movie_extras,
+                "arrays": layout,
+            }
+        )
+
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+    data_start = len(MAGIC) + 4 + len(header_bytes)
+    data_start += -data_start % ALIGNMENT
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+        for blob in blobs:
+            f.write(blob)
+        size = f.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+class Partition:
+    """
+    The showtimes of one snapshot and date.
+    Each row is one movie at one theater; row arrays (theater, title, subtitle,
+    screen_type) are indexed by row, and the showtimes of row i are
+    start[showtime_offsets[i]:showtime_offsets[i + 1]] (likewise end), as
+    business-day offsets (minutes after midnight in version 1 and 2 stores).
+    The arrays are views of the memory-mapped file, not copies.
+    """
+
+    def __init__(self, store, meta, arrays):
+        self.store = store
+        self.snapshot = meta["snapshot"]
+        self.date = meta["date"]
+        self.theater_rows = {int(k): v for k, v in meta["theaters"].items()}
+        self.raw_showtimes = meta["raw_showtimes"]
+        self.format_time = (
+            format_time if store.version >= BUSINESS_DAY_VERSION else minutes_to_time
+        )
+        self.movie_extras = meta["movie_extras"]
+        for name, values in arrays.items():
+            setattr(self, name, values)
+
+    def __len__(self):
+        return len(self.theater)
+
+    def showtime_range(self, row):
+        return self.showtime_offsets[row], self.showtime_offsets[row + 1]
+
+    def movie(self, row):
+        """Rebuild the JSON movie record of a row"""
+        movie = {"title": self.store.titles[self.title[row]]}
+        for name in ("subtitle", "screen_type"):
+            label = getattr(self, name)[row]
+            if label != ABSENT:
+                movie[name] = self.store.labels[label]
+        first, last = self.showtime_range(row)
+        showtimes = []
+        for i in range(first, last):
+            start, end = self.start[i], self.end[i]
+            if start == RAW:
+                showtimes.append(self.raw_showtimes[str(i)])
+            elif end == NO_END:
+                showtimes.append(self.format_time(start))
+            elif end == OPEN_END:
+                showtimes.append([self.format_time(start), None])
+            else:
+                showtimes.append([self.format_time(start), self.format_time(end)])
+        movie["showtimes"] = showtimes
+        movie.update(self.movie_extras.get(str(row), {}))
+        return movie
+
+    def movies(self, theater_index):
+        """Rebuild the JSON movie list of a theater, or None if it has no rows here"""
+        if theater_index not in self.theater_rows:
+            return None
+        first, last = self.theater_rows[theater_index]
+        return [self.movie(row) for row in range(first, last)]
+
+
+class ScheduleStore:
+    """
+    Read-only, memory-mapped access to a file written by write_store().
+    The showtime arrays of each partition are zero-copy views into the mapping,
+    so they are only valid until close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a schedule store")
+        (header_length,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 4
+        header = json.loads(
+            self._mmap[header_start : header_start + header_length].decode("utf-8")
+        )
+        if header["version"] not in READABLE_VERSIONS:
+            self.close()
+            raise ValueError(f"Unsupported schedule store version {header['version']}")
+        self.version = header["version"]
+        data_start = header_start + header_length
+        data_start += -data_start % ALIGNMENT
+
+        self.theaters = [dict(zip(THEATER_FIELDS, t)) for t in header["theaters"]]
+        self.titles = header["titles"]
+        self.labels = header["labels"]
+        self._snapshots = {s["name"]: s["theaters"] for s in header["snapshots"]}
+
+        typecodes = dict(ROW_ARRAYS + SHOWTIME_ARRAYS, showtime_offsets="I")
+        self._partitions = {}
+        for meta in header["partitions"]:
+            arrays = {
+                name: self._array(data_start + offset, count, typecodes[name])
+                for name, (offset, count) in meta["arrays"].items()
+            }
+            partition = Partition(self, meta, arrays)
+            self._partitions[(partition.snapshot, partition.date)] = partition
+
+    def _array(self, offset, count, typecode):
+        size = count * array(typecode).itemsize
+        if sys.byteorder != "little":
+            # Big-endian hosts can't use the little-endian data in place
+            values = array(typecode, self._mmap[offset : offset + size])
+            values.byteswap()
+            return values
+        view = memoryview(self._mmap)[offset : offset + size].cast(typecode)
+        self._views.append(view)
+        return view
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def snapshots(self):
+        return list(self._snapshots)
+
+    def dates(self, snapshot):
+        return [date for s, date in self._partitions if s == snapshot]
+
+    def partition(self, snapshot, date):
+        return self._partitions.get((snapshot, date))
+
+    def to_json(self, snapshot):
+        """Rebuild the theater records of a snapshot as movie_schedules_*.json holds them"""
+        records = []
+        for entry in self._snapshots[snapshot]:
+            index = entry["theater"]
+            theater = self.theaters[index]
+            record = {field: theater[field] for field in entry["fields"]}
+            scrape_date = entry["scrape_date"]
+            record["movies"] = self.partition(snapshot, scrape_date).movies(index)
+            record["scrape_date"] = scrape_date
+            if "schedules" in entry:
+                record["schedules"] = {
+                    date: self.partition(snapshot, date).movies(index)
+                    for date in entry["schedules"]
+                }
+            record.update(entry.get("extra", {}))
+            records.append(record)
+        return records
+
+
+def load_snapshots(paths):
+    snapshots = []
+    for path in sorted(paths, key=snapshot_name):
+        with open(path, "r", encoding="utf-8") as f:
+            snapshots.append((snapshot_name(path), json.load(f)))
+    return snapshots
+
+
+def verify(path, snapshots):
+    """Return the names of the snapshots that don't round-trip through the store"""
+    with ScheduleStore(path) as store:
+        return [name for name, records in snapshots if store.to_json(name) != records]
+
+
+def main():
+    """Pack movie_schedules_*.json files into one columnar schedule store"""
+    parser = argparse.ArgumentParser(
+        description="Write scraped schedules as interned tables and packed minute arrays"
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="movie_schedules_YYYYMMDD.json files to pack"
+    )
+    parser.add_argument(
+        "--output", default=OUTPUT_PATH, help=f"Store to write (default {OUTPUT_PATH})"
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Reload the store and check that every input is reproduced exactly",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    snapshots = load_snapshots(args.inputs)
+    try:
+        size = write_store(args.output, snapshots)
+    except ValueError as e:
+        logger.error(f"Error packing schedules: {e}")
+        sys.exit(1)
+    json_size = sum(os.path.getsize(path) for path in args.inputs)
+    logger.info(
+        f"Wrote {len(snapshots)} snapshots to {args.output}: "
+        f"{size / 1024:.1f} KB (JSON {json_size / 1024:.1f} KB)"
+    )
+
+    if args.verify:
+        mismatched = verify(args.output, snapshots)
+        for name in mismatched:
+            logger.error(f"Snapshot {name} does not round-trip")
+        if mismatched:
+            sys.exit(1)
+        logger.info("All snapshots round-trip")
+
+
+if __name__ == "__main__":
+    main()
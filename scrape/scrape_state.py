@@ -0,0 +1,112 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+STATE_PATH = "scrape/scrape_state.json"
+
+# Outcomes counted in the run summary
+UNCHANGED = "unchanged"
+REFRESHED = "refreshed"
+# Failed this run, so the last-known-good record was carried forward
+STALE = "stale"
+FAILED = "failed"
+
+
+def region_hash(soup):
+    """Hash the parsed schedule region of a page"""
+    return hashlib.sha256(soup.encode()).hexdigest()
+
+
+class ScrapeState:
+    """
+    Per-theater validators from the last successful scrape: the ETag and
+    Last-Modified headers of the page and a hash of its schedule region.
+    """
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading scrape state {self.path}: {e}")
+            return {}
+
+    def get(self, theater_name):
+        with self._lock:
+            return dict(self._entries.get(theater_name, {}))
+
+    def update(self, theater_name, **fields):
+        with self._lock:
+            entry = self._entries.setdefault(theater_name, {})
+            entry.update({k: v for k, v in fields.items() if v is not None})
+            entry["checked_at"] = datetime.now().isoformat(timespec="seconds")
+
+    def save(self):
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+class RunSummary:
+    """Thread-safe count of how each theater in a run turned out"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def mark(self, status):
+        with self._lock:
+            self._counts[status] += 1
+
+    def counts(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def __str__(self):
+        counts = self.counts()
+        return ", ".join(
+            f"{counts.get(status, 0)} {status}"
+            for status in (UNCHANGED, REFRESHED, STALE, FAILED)
+        )
+
+
+def latest_schedule_path(output_dir):
+    """The most recent movie_schedules_YYYYMMDD.json in a directory, or None"""
+    paths = sorted(
+        path
+        for path in glob.glob(os.path.join(output_dir, "movie_schedules_*.json"))
+        if re.fullmatch(r"movie_schedules_\d{8}\.json", os.path.basename(path))
+    )
+    return paths[-1] if paths else None
+
+
+def load_previous_results(output_dir):
+    """Load the most recent movie_schedules_*.json as a dict keyed by theater_name"""
+    path = latest_schedule_path(output_dir)
+    if not path:
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            results = json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading previous results {path}: {e}")
+        return {}
+    logger.info(f"Loaded previous results from {path}")
+    return {result["theater_name"]: result for result in results}
@@ -0,0 +1,419 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+# Every n-gram of these lengths is indexed, so one-character queries also hit
+GRAM_SIZES = (1, 2)
+
+# Katakana -> Hepburn romaji; two-character entries are the small-kana digraphs
+ROMAJI = {
+    "ア": "a", "イ": "i", "ウ": "u", "エ": "e", "オ": "o",
+    "カ": "ka", "キ": "ki", "ク": "ku", "ケ": "ke", "コ": "ko",
+    "サ": "sa", "シ": "shi", "ス": "su", "セ": "se", "ソ": "so",
+    "タ": "ta", "チ": "chi", "ツ": "tsu", "テ": "te", "ト": "to",
+    "ナ": "na", "ニ": "ni", "ヌ": "nu", "ネ": "ne", "ノ": "no",
+    "ハ": "ha", "ヒ": "hi", "フ": "fu", "ヘ": "he", "ホ": "ho",
+    "マ": "ma", "ミ": "mi", "ム": "mu", "メ": "me", "モ": "mo",
+    "ヤ": "ya", "ユ": "yu", "ヨ": "yo",
+    "ラ": "ra", "リ": "ri", "ル": "ru", "レ": "re", "ロ": "ro",
+    "ワ": "wa", "ヰ": "i", "ヱ": "e", "ヲ": "o", "ン": "n",
+    "ガ": "ga", "ギ": "gi", "グ": "gu", "ゲ": "ge", "ゴ": "go",
+    "ザ": "za", "ジ": "ji", "ズ": "zu", "ゼ": "ze", "ゾ": "zo",
+    "ダ": "da", "ヂ": "ji", "ヅ": "zu", "デ": "de", "ド": "do",
+    "バ": "ba", "ビ": "bi", "ブ": "bu", "ベ": "be", "ボ": "bo",
+    "パ": "pa", "ピ": "pi", "プ": "pu", "ペ": "pe", "ポ": "po",
+    "ヴ": "vu",
+    "ァ": "a", "ィ": "i", "ゥ": "u", "ェ": "e", "ォ": "o",
+    "ャ": "ya", "ュ": "yu", "ョ": "yo", "ヮ": "wa",
+    "キャ": "kya", "キュ": "kyu", "キョ": "kyo",
+    "シャ": "sha", "シュ": "shu", "シェ": "she", "ショ": "sho",
+    "チャ": "cha", "チュ": "chu", "チェ": "che", "チョ": "cho",
+    "ニャ": "nya", "ニュ": "nyu", "ニョ": "nyo",
+    "ヒャ": "hya", "ヒュ": "hyu", "ヒョ": "hyo",
+    "ミャ": "mya", "ミュ": "myu", "ミョ": "myo",
+    "リャ": "rya", "リュ": "ryu", "リョ": "ryo",
+    "ギャ": "gya", "ギュ": "gyu", "ギョ": "gyo",
+    "ジャ": "ja", "ジュ": "ju", "ジェ": "je", "ジョ": "jo",
+    "ビャ": "bya", "ビュ": "byu", "ビョ": "byo",
+    "ピャ": "pya", "ピュ": "pyu", "ピョ": "pyo",
+    "ファ": "fa", "フィ": "fi", "フェ": "fe", "フォ": "fo",
+    "ティ": "ti", "ディ": "di", "トゥ": "tu", "ドゥ": "du",
+    "ウィ": "wi", "ウェ": "we", "ウォ": "wo",
+    "ヴァ": "va", "ヴィ": "vi", "ヴェ": "ve", "ヴォ": "vo",
+}  # fmt: skip
+
+
+def fold(text):
+    """
+    Fold text for matching: NFKC, case-folded, hiragana as katakana, and with
+    spaces, slashes and other separators removed.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    chars = []
+    for char in text:
+        if "ぁ" <= char <= "ゖ":
+            char = chr(ord(char) + 0x60)
+        if unicodedata.category(char)[0] in "LN":
+            chars.append(char)
+    return "".join(chars)
+
+
+def tokens(text):
+    """Split text into folded tokens at spaces, slashes and other separators"""
+    text = unicodedata.normalize("NFKC", text)
+    words = []
+    word = ""
+    for char in text:
+        if unicodedata.category(char)[0] in "LN":
+            word += char
+        elif word:
+            words.append(word)
+            word = ""
+    if word:
+        words.append(word)
+    return [fold(word) for word in words]
+
+
+def romaji(folded):
+    """Romanize the katakana of folded text; other characters are kept as they are"""
+    out = []
+    i = 0
+    double_next = False
+    while i < len(folded):
+        pair, char = folded[i : i + 2], folded[i]
+        if pair in ROMAJI:
+            syllable, i = ROMAJI[pair], i + 2
+        elif char == "ッ":
+            double_next, i = True, i + 1
+            continue
+        elif char == "ー":
+            # Long vowel mark: repeat the previous vowel
+            syllable = out[-1][-1] if out and out[-1][-1] in "aiueo" else ""
+            i += 1
+        else:
+            syllable, i = ROMAJI.get(char, char), i + 1
+        if double_next and syllable[:1].isalpha() and syllable[0] not in "aiueo":
+            syllable = syllable[0] + syllable
+        double_next = False
+        out.append(syllable)
+    return "".join(out)
+
+
+def search_keys(text):
+    """The folded forms a query is matched against: as written, and romanized"""
+    folded = fold(text)
+    keys = [folded]
+    romanized = romaji(folded)
+    if romanized != folded:
+        keys.append(romanized)
+    return keys
+
+
+def grams(keys):
+    """Every n-gram of GRAM_SIZES in the given keys"""
+    found = set()
+    for key in keys:
+        for size in GRAM_SIZES:
+            found.update(key[i : i + size] for i in range(len(key) - size + 1))
+    return found
+
+
+def delta_encode(ids):
+    """Sorted ids as gaps from the previous id, which keeps the JSON short"""
+    previous = 0
+    gaps = []
+    for value in ids:
+        gaps.append(value - previous)
+        previous = value
+    return gaps
+
+
+def delta_decode(gaps):
+    ids = []
+    total = 0
+    for gap in gaps:
+        total += gap
+        ids.append(total)
+    return ids
+
+
+def schedule_movies(record):
+    """Every movie of a theater record, over all scraped dates"""
+    yield from record.get("movies") or []
+    for date, movies in (record.get("schedules") or {}).items():
+        if date != record.get("scrape_date"):
+            yield from movies or []
+
+
+def build_index(records):
+    """
+    Build the search index of a list of theater records.
+    Theater ids are positions in `records`; movie ids number the distinct titles.
+    """
+    theaters = [record["theater_name"] for record in records]
+    movie_ids = {}
+    movie_theaters = []
+    for theater_id, record in enumerate(records):
+        for movie in schedule_movies(record):
+            title = movie["title"]
+            if title not in movie_ids:
+                movie_ids[title] = len(movie_ids)
+                movie_theaters.append(set())
+            movie_theaters[movie_ids[title]].add(theater_id)
+
+    movies = []
+    movie_grams = {}
+    for title, movie_id in movie_ids.items():
+        keys = search_keys(title)
+        movies.append({"title": title, "keys": keys, "tokens": tokens(title)})
+        for gram in grams(keys):
+            movie_grams.setdefault(gram, []).append(movie_id)
+
+    theater_grams = {}
+    theater_keys = []
+    for theater_id, record in enumerate(records):
+        keys = search_keys(record["theater_name"])
+        name_en = record.get("theater_name_en")
+        if name_en and name_en != record["theater_name"]:
+            keys += search_keys(name_en)
+        theater_keys.append(keys)
+        for gram in grams(keys):
+            theater_grams.setdefault(gram, []).append(theater_id)
+
+    return {
+        "version": VERSION,
+        "gram_sizes": list(GRAM_SIZES),
+        "theaters": theaters,
+        "theater_keys": theater_keys,
+        "movies": movies,
+        "movie_theaters": [delta_encode(sorted(ids)) for ids in movie_theaters],
+        "movie_grams": {g: delta_encode(ids) for g, ids in sorted(movie_grams.items())},
+        "theater_grams": {
+            g: delta_encode(ids) for g, ids in sorted(theater_grams.items())
+        },
+    }
+
+
+def index_path(schedule_path):
+    """data/movie_schedules_YYYYMMDD.json -> data/movie_schedules_YYYYMMDD.index.json"""
+    return f"{os.path.splitext(schedule_path)[0]}.index.json"
+
+
+def write_index(path, records):
+    index = build_index(records)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    logger.info(
+        f"Indexed {len(index['movies'])} titles at {len(index['theaters'])} "
+        f"theaters to {path}"
+    )
+    return index
+
+
+class SearchIndex:
+    """Query API over an index written by write_index()"""
+
+    def __init__(self, index):
+        self.theaters = index["theaters"]
+        self.movies = index["movies"]
+        self._theater_keys = index["theater_keys"]
+        # Posting lists are decoded once here rather than on every query
+        self._movie_theaters = [delta_decode(gaps) for gaps in index["movie_theaters"]]
+        self._movie_grams = {
+            g: delta_decode(v) for g, v in index["movie_grams"].items()
+        }
+        self._theater_grams = {
+            g: delta_decode(v) for g, v in index["theater_grams"].items()
+        }
+        self._max_gram = max(index["gram_sizes"])
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _candidates(self, postings, key):
+        """Intersect the posting lists of the longest n-grams of a folded key"""
+        size = min(len(key), self._max_gram)
+        lists = []
+        for i in range(len(key) - size + 1):
+            ids = postings.get(key[i : i + size])
+            if ids is None:
+                return set()
+            lists.append(ids)
+        lists.sort(key=len)
+        ids = set(lists[0])
+        for other in lists[1:]:
+            ids.intersection_update(other)
+            if not ids:
+                break
+        return ids
+
+    def _match(self, postings, keys_of, query):
+        """Ids whose keys contain the query as written or romanized"""
+        matches = set()
+        for key in search_keys(query):
+            if not key:
+                continue
+            for item_id in self._candidates(postings, key):
+                # n-grams can all occur without being adjacent, so confirm the match
+                if any(key in item_key for item_key in keys_of(item_id)):
+                    matches.add(item_id)
+        return matches
+
+    def search_movies(self, query, limit=None):
+        """
+        Return [(title, [theater names])] of the titles matching the query,
+        whole-token matches first, then prefix matches, then the rest.
+        """
+        ids = self._match(
+            self._movie_grams, lambda movie_id: self.movies[movie_id]["keys"], query
+        )
+        folded = fold(query)
+
+        def rank(movie_id):
+            movie = self.movies[movie_id]
+            if folded in movie["tokens"]:
+                return 0, movie_id
+            if movie["keys"][0].startswith(folded):
+                return 1, movie_id
+            return 2, movie_id
+
+        results = []
+        for movie_id in sorted(ids, key=rank)[:limit]:
+            theater_ids = self._movie_theaters[movie_id]
+            results.append(
+                (
+                    self.movies[movie_id]["title"],
+                    [self.theaters[theater_id] for theater_id in theater_ids],
+                )
+            )
+        return results
+
+    def search_theaters(self, query, limit=None):
+        """Return the names of the theaters matching the query"""
+        ids = self._match(
+            self._theater_grams,
+            lambda theater_id: self._theater_keys[theater_id],
+            query,
+        )
+        return [self.theaters[theater_id] for theater_id in sorted(ids)[:limit]]
+
+
+def linear_search(records, query):
+    """Scan every movie of every theater, as the webapp's search box does"""
+    keys = [key for key in search_keys(query) if key]
+    matches = set()
+    for record in records:
+        for movie in schedule_movies(record):
+            title_keys = search_keys(movie["title"])
+            if any(key in title_key for key in keys for title_key in title_keys):
+                matches.add(movie["title"])
+    return matches
+
+
+def synthetic_records(records, scale):
+    """Copies of the records with renamed theaters and titles, `scale` times over"""
+    synthetic = []
+    for copy in range(scale):
+        for record in records:
+            synthetic.append(
+                {
+                    **record,
+                    "theater_name": f"{record['theater_name']} {copy}",
+                    "movies": [
+                        {**movie, "title": f"{movie['title']} {copy}"}
+                        for movie in record.get("movies") or []
+                    ],
+                    "schedules": None,
+                }
+            )
+    return synthetic
+
+
+def benchmark(records, scales, queries, repeat):
+    """Print the time per query of the index and of a linear scan as the catalog grows"""
+    print(f"{'scale':>6} {'titles':>7} {'index us/query':>15} {'scan us/query':>14}")
+    for scale in scales:
+        synthetic = synthetic_records(records, scale)
+        index = SearchIndex(build_index(synthetic))
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            found = [index.search_movies(query) for query in queries]
+        index_us = (time.perf_counter() - start) / (repeat * len(queries)) * 1e6
+
+        start = time.perf_counter()
+        scanned = [linear_search(synthetic, query) for query in queries]
+        scan_us = (time.perf_counter() - start) / len(queries) * 1e6
+
+        for query, results, titles in zip(queries, found, scanned):
+            if {title for title, _ in results} != titles:
+                logger.error(f"Index and scan disagree on {query!r}")
+        print(f"{scale:>6} {len(index.movies):>7} {index_us:>15.1f} {scan_us:>14.1f}")
+
+
+def main():
+    """Build the search index of a schedule file, query it or benchmark it"""
+    parser = argparse.ArgumentParser(
+        description="Pre-built title and theater search index for scraped schedules"
+    )
+    parser.add_argument("schedules", help="movie_schedules_YYYYMMDD.json to index")
+    parser.add_argument(
+        "--output", help="Index to write (default: next to the schedule file)"
+    )
+    parser.add_argument("--query", help="Search the index for movies and theaters")
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="Compare the index against a linear scan on enlarged copies of the data",
+    )
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="*",
+        default=[1, 10, 100],
+        help="Catalog sizes to benchmark, as multiples of the input",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="Index queries to average over"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    with open(args.schedules, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    if not records:
+        logger.error(f"No theaters in {args.schedules}")
+        sys.exit(1)
+
+    if args.benchmark:
+        titles = [m["title"] for r in records for m in schedule_movies(r)]
+        queries = [
+            title[:3] for title in random.Random(0).sample(titles, min(5, len(titles)))
+        ]
+        benchmark(records, args.scales, queries, args.repeat)
+        return
+
+    index = SearchIndex(write_index(args.output or index_path(args.schedules), records))
+    if args.query:
+        for title, theaters in index.search_movies(args.query):
+            print(f"{title}: {', '.join(theaters)}")
+        for theater in index.search_theaters(args.query):
+            print(f"[theater] {theater}")
+
+
+if __name__ == "__main__":
+    main()
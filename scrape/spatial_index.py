@@ -0,0 +1,499 @@
+import argparse
+import csv
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+from bisect import bisect_left
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+THEATERS_CSV_PATH = "scrape/theater_names.csv"
+OUTPUT_PATH = "data/theater_spatial_index.json"
+VERSION = 1
+# Finest grid to use; precision 7 cells are about 150 m across
+MAX_PRECISION = 7
+# Theaters per cell the grid is sized for, so a few rings find the nearest k
+CELL_OCCUPANCY = 0.5
+# Osaka, Sapporo, Naha, Sydney, New York, 0, 0 and the poles
+FAR_POINTS = [
+    (34.69, 135.50),
+    (43.06, 141.35),
+    (26.21, 127.68),
+    (-33.87, 151.21),
+    (40.71, -74.01),
+    (0.0, 0.0),
+    (90.0, 0.0),
+    (-90.0, 0.0),
+]
+EARTH_RADIUS_KM = 6371
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometers"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def geohash(lat, lon, precision=MAX_PRECISION):
+    """Encode a point as a geohash string"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, interval = (lon, lon_range) if even else (lat, lat_range)
+        middle = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """Return the (lat, lon) size in degrees of a geohash cell"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+
+def spread(values):
+    """
+    Twice the interquartile range of the values: the extent of an even spread
+    of them, which a quarter of outliers at either end leaves unchanged
+    """
+    values = sorted(values)
+    return 2 * (values[3 * len(values) // 4] - values[len(values) // 4])
+
+
+def choose_precision(theaters):
+    """The finest precision whose cells over where the theaters are are not too sparse"""
+    if not theaters:
+        return 1
+    lat_spread = spread(t["latitude"] for t in theaters)
+    lon_spread = spread(t["longitude"] for t in theaters)
+    for precision in range(MAX_PRECISION, 1, -1):
+        cell_lat, cell_lon = cell_size(precision)
+        cells = (lat_spread / cell_lat + 1) * (lon_spread / cell_lon + 1)
+        if len(theaters) / cells >= CELL_OCCUPANCY:
+            return precision
+    return 1
+
+
+def read_theater_rows(path=THEATERS_CSV_PATH):
+    """
+    Return the rows of the theater list, with latitude and longitude as floats,
+    or None for rows that were never geocoded
+    """
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        # The header has a space after each comma
+        for row in csv.DictReader(f, skipinitialspace=True):
+            for field in ("latitude", "longitude"):
+                try:
+                    row[field] = float(row.get(field))
+                except (TypeError, ValueError):
+                    row[field] = None
+            rows.append(row)
+    return rows
+
+
+def load_theater_locations(path=THEATERS_CSV_PATH):
+    """Return [{theater_name, latitude, longitude}] for the rows with coordinates"""
+    return [
+        {
+            "theater_name": row["theater_name"],
+            "latitude": row["latitude"],
+            "longitude": row["longitude"],
+        }
+        for row in read_theater_rows(path)
+        if row["latitude"] is not None and row["longitude"] is not None
+    ]
+
+
+class SpatialIndex:
+    """
+    Theaters bucketed into geohash grid cells, by default of a precision
+    chosen from how densely the theaters are spread.
+    nearest() only visits the cells in rings around the query point until no
+    unvisited cell can hold anything closer.
+    """
+
+    def __init__(self, theaters, precision=None, cells=None):
+        self.theaters = theaters
+        self.precision = precision or choose_precision(theaters)
+        precision = self.precision
+        self.cell_lat, self.cell_lon = cell_size(precision)
+        if cells is None:
+            cells = {}
+            for theater_id, theater in enumerate(theaters):
+                cell = geohash(theater["latitude"], theater["longitude"], precision)
+                cells.setdefault(cell, []).append(theater_id)
+        self.cells = cells
+        # The same cells by row and column, for radius queries
+        self.rows = round(180.0 / self.cell_lat)
+        self.columns = round(360.0 / self.cell_lon)
+        self.grid = {}
+        for theater_id, theater in enumerate(theaters):
+            row_col = self._grid_cell(theater["latitude"], theater["longitude"])
+            self.grid.setdefault(row_col, []).append(theater_id)
+        self.occupied_rows = sorted({row for row, _ in self.grid})
+        self.occupied_columns = sorted({col for _, col in self.grid})
+
+    def to_json(self):
+        return {
+            "version": VERSION,
+            "precision": self.precision,
+            "theaters": self.theaters,
+            "cells": self.cells,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["theaters"], data["precision"], data["cells"])
+
+    @classmethod
+    def load(cls, path=OUTPUT_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_json(json.load(f))
+
+    def save(self, path=OUTPUT_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        logger.info(
+            f"Indexed {len(self.theaters)} theaters in {len(self.cells)} cells to {path}"
+        )
+
+    def _grid_row(self, lat):
+        return min(self.rows - 1, max(0, math.floor((lat + 90) / self.cell_lat)))
+
+    def _grid_col(self, lon):
+        return math.floor((lon + 180) / self.cell_lon) % self.columns
+
+    def _grid_cell(self, lat, lon):
+        return self._grid_row(lat), self._grid_col(lon)
+
+    def _ring(self, row, col, ring):
+        """Grid cells `ring` steps away from a cell, longitudes wrapping around"""
+        cells = set()
+        for dy in range(-ring, ring + 1):
+            cell_row = row + dy
+            if not 0 <= cell_row < self.rows:
+                continue
+            if abs(dy) == ring:
+                cols = range(col - ring, col + ring + 1)
+            else:
+                cols = (col - ring, col + ring)
+            cells.update((cell_row, cell_col % self.columns) for cell_col in cols)
+        return cells
+
+    def _ring_gap_km(self, lat, ring):
+        """Lower bound on the distance to any point `ring` cells away"""
+        edge_lat = min(89.0, abs(lat) + (ring + 1) * self.cell_lat)
+        cell_km = min(
+            math.radians(self.cell_lat),
+            math.radians(self.cell_lon) * math.cos(math.radians(edge_lat)),
+        )
+        return (ring - 1) * cell_km * EARTH_RADIUS_KM
+
+    def _farthest_ring(self, row, col):
+        """Rings from a cell to the farthest cell holding a theater"""
+        farthest = max(row - self.occupied_rows[0], self.occupied_rows[-1] - row, 0)
+        # The farthest column is the occupied one closest to the opposite side
+        opposite = (col + self.columns // 2) % self.columns
+        i = bisect_left(self.occupied_columns, opposite)
+        for cell_col in (
+            self.occupied_columns[i % len(self.occupied_columns)],
+            self.occupied_columns[i - 1],
+        ):
+            col_gap = abs(cell_col - col)
+            farthest = max(farthest, min(col_gap, self.columns - col_gap))
+        return farthest
+
+    def scan(self, lat, lon, k=5, max_km=None, allowed=None):
+        """nearest() by computing the distance to every theater"""
+        found = []
+        for theater in self.theaters:
+            if allowed is not None and theater["theater_name"] not in allowed:
+                continue
+            distance = haversine_km(lat, lon, theater["latitude"], theater["longitude"])
+            if max_km is None or distance <= max_km:
+                found.append((distance, theater))
+        found.sort(key=lambda item: item[0])
+        return found[:k]
+
+    def nearest(self, lat, lon, k=5, max_km=None, allowed=None):
+        """
+        Return up to k (distance_km, theater) pairs closest to a point, nearest first.
+        max_km limits the search radius; `allowed` is an optional set of
+        theater names to choose from, e.g. the theaters showing a given title.
+        Far from every theater the rings would hold more cells than there are
+        theaters, so the search turns into a scan of all of them.
+        """
+        found = []
+        ring = 0
+        # Rings past the farthest occupied cell hold nothing
+        if not self.theaters:
+            return []
+        row, col = self._grid_cell(lat, lon)
+        max_ring = self._farthest_ring(row, col)
+        if max_km is not None:
+            radius_ring = 1
+            while (
+                radius_ring < max_ring and self._ring_gap_km(lat, radius_ring) <= max_km
+            ):
+                radius_ring += 1
+            max_ring = min(max_ring, radius_ring)
+        remaining = len(self.theaters)
+        visited_cells = 0
+
+        while ring <= max_ring and remaining:
+            if len(found) >= k and self._ring_gap_km(lat, ring) > found[k - 1][0]:
+                break
+            visited_cells += 8 * ring or 1
+            if visited_cells > len(self.theaters):
+                return self.scan(lat, lon, k, max_km, allowed)
+            for cell in self._ring(row, col, ring):
+                for theater_id in self.grid.get(cell, ()):
+                    remaining -= 1
+                    theater = self.theaters[theater_id]
+                    if allowed is not None and theater["theater_name"] not in allowed:
+                        continue
+                    distance = haversine_km(
+                        lat, lon, theater["latitude"], theater["longitude"]
+                    )
+                    if max_km is None or distance <= max_km:
+                        found.append((distance, theater))
+            found.sort(key=lambda item: item[0])
+            ring += 1
+        return found[:k]
+
+    def within(self, lat, lon, max_km):
+        """
+        Return (distance_km, theater) for every theater within max_km of a
+        point, nearest first. Only the cells overlapping the bounding box of
+        the radius are read, without computing any geohash.
+        """
+        radius = max_km / EARTH_RADIUS_KM
+        lat_span = math.degrees(radius)
+        rows = range(self._grid_row(lat - lat_span), self._grid_row(lat + lat_span) + 1)
+        # The widest longitude a circle spans, unless it reaches over a pole
+        reach = math.sin(radius) / math.cos(math.radians(lat))
+        if radius >= math.pi / 2 or reach >= 1:
+            columns = range(self.columns)
+        else:
+            lon_span = math.degrees(math.asin(reach))
+            first_col = math.floor((lon - lon_span + 180) / self.cell_lon)
+            last_col = math.floor((lon + lon_span + 180) / self.cell_lon)
+            columns = {col % self.columns for col in range(first_col, last_col + 1)}
+
+        found = []
+        for row in rows:
+            for col in columns:
+                for theater_id in self.grid.get((row, col), ()):
+                    theater = self.theaters[theater_id]
+                    distance = haversine_km(
+                        lat, lon, theater["latitude"], theater["longitude"]
+                    )
+                    if distance <= max_km:
+                        found.append((distance, theater))
+        found.sort(key=lambda item: item[0])
+        return found
+
+
+def brute_force_nearest(theaters, lat, lon, k=5, max_km=None):
+    """Distance to every theater, as the webapp computes it; NumPy when available"""
+    if np is None:
+        found = sorted(
+            (
+                (haversine_km(lat, lon, t["latitude"], t["longitude"]), t)
+                for t in theaters
+            ),
+            key=lambda item: item[0],
+        )
+    else:
+        lats = np.radians([t["latitude"] for t in theaters])
+        lons = np.radians([t["longitude"] for t in theaters])
+        lat_r, lon_r = math.radians(lat), math.radians(lon)
+        a = (
+            np.sin((lats - lat_r) / 2) ** 2
+            + math.cos(lat_r) * np.cos(lats) * np.sin((lons - lon_r) / 2) ** 2
+        )
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(1.0, a)))
+        order = np.argsort(distances)[:k]
+        found = [(float(distances[i]), theaters[i]) for i in order]
+    if max_km is not None:
+        found = [item for item in found if item[0] <= max_km]
+    return found[:k]
+
+
+def far_points(count, seed=0):
+    """Query points far from Tokyo: other cities, the poles and anywhere at random"""
+    rng = random.Random(seed)
+    return FAR_POINTS + [
+        (rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(count)
+    ]
+
+
+def check_nearest(index, points, k=5, max_km=None):
+    """The points where nearest() and a brute-force scan find other distances"""
+    mismatches = []
+    for lat, lon in points:
+        grid = index.nearest(lat, lon, k, max_km)
+        brute = brute_force_nearest(index.theaters, lat, lon, k, max_km)
+        if [round(d, 6) for d, _ in grid] != [round(d, 6) for d, _ in brute]:
+            mismatches.append((lat, lon))
+    return mismatches
+
+
+def synthetic_theaters(count, seed=0):
+    """Random theaters spread over the Tokyo area"""
+    rng = random.Random(seed)
+    return [
+        {
+            "theater_name": f"theater {i}",
+            "latitude": rng.uniform(35.5, 35.9),
+            "longitude": rng.uniform(139.4, 139.95),
+        }
+        for i in range(count)
+    ]
+
+
+def benchmark(sizes, queries, k, max_km):
+    """Print the time per query of the grid and of the brute-force scan"""
+    brute = "NumPy" if np is not None else "Python"
+    print(
+        f"{'theaters':>9} {'cells':>6} {'grid us/query':>14} {'far us/query':>13} "
+        f"{brute + ' us/query':>16}"
+    )
+    rng = random.Random(1)
+    points = [
+        (rng.uniform(35.5, 35.9), rng.uniform(139.4, 139.95)) for _ in range(queries)
+    ]
+    # Points far from every theater, where the rings give way to a scan
+    far = far_points(queries // 10)
+    for size in sizes:
+        theaters = synthetic_theaters(size)
+        index = SpatialIndex(theaters)
+
+        start = time.perf_counter()
+        for lat, lon in points:
+            index.nearest(lat, lon, k, max_km)
+        grid_us = (time.perf_counter() - start) / queries * 1e6
+
+        start = time.perf_counter()
+        for lat, lon in far:
+            index.nearest(lat, lon, k, max_km)
+        far_us = (time.perf_counter() - start) / len(far) * 1e6
+
+        start = time.perf_counter()
+        for lat, lon in points:
+            brute_force_nearest(theaters, lat, lon, k, max_km)
+        brute_us = (time.perf_counter() - start) / queries * 1e6
+
+        for lat, lon in check_nearest(index, points + far, k, max_km):
+            logger.error(f"Grid and brute force disagree at {lat}, {lon}")
+        print(
+            f"{size:>9} {len(index.cells):>6} {grid_us:>14.1f} {far_us:>13.1f} "
+            f"{brute_us:>16.1f}"
+        )
+
+
+def main():
+    """Build the theater spatial index, query it or benchmark it"""
+    parser = argparse.ArgumentParser(
+        description="Geohash grid of theater locations for nearest-theater queries"
+    )
+    parser.add_argument("--csv", default=THEATERS_CSV_PATH, help="Theater list")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="Index to write")
+    parser.add_argument(
+        "--near",
+        nargs=2,
+        type=float,
+        metavar=("LAT", "LON"),
+        help="Print the theaters nearest to a point",
+    )
+    parser.add_argument("-k", type=int, default=5, help="Theaters to return")
+    parser.add_argument("--max-km", type=float, help="Search radius")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Compare nearest() with a brute-force scan at points far and near",
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="Compare the grid with a brute-force haversine scan on synthetic data",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="*",
+        default=[100, 1000, 10000, 100000],
+        help="Synthetic theater counts to benchmark",
+    )
+    parser.add_argument(
+        "--queries", type=int, default=200, help="Query points per benchmark size"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    if args.benchmark:
+        benchmark(args.sizes, args.queries, args.k, args.max_km)
+        return
+
+    theaters = load_theater_locations(args.csv)
+    if not theaters:
+        logger.error(f"No theaters with coordinates in {args.csv}")
+        sys.exit(1)
+    index = SpatialIndex(theaters)
+    if args.check:
+        rng = random.Random(0)
+        points = [
+            (rng.uniform(35.5, 35.9), rng.uniform(139.4, 139.95)) for _ in range(200)
+        ] + far_points(200)
+        mismatches = check_nearest(index, points, args.k, args.max_km)
+        for lat, lon in mismatches:
+            logger.error(f"Grid and brute force disagree at {lat}, {lon}")
+        print(f"{len(points)} points, {len(mismatches)} disagreements")
+        sys.exit(1 if mismatches else 0)
+    index.save(args.output)
+    if args.near:
+        for distance, theater in index.nearest(*args.near, args.k, args.max_km):
+            print(f"{distance:6.2f} km  {theater['theater_name']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import argparse
+import json
+import logging
+import random
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from movie_entities import theater_schedules
+from schedule_model import (
+    MINUTES_PER_DAY,
+    Movie,
+    Showtime,
+    business_time,
+    format_time,
+    movies_from_json,
+    movies_to_json,
+)
+from spatial_index import SpatialIndex, haversine_km, synthetic_theaters
+
+logger = logging.getLogger(__name__)
+
+WINDOW_MINUTES = 30
+MAX_KM = 3.0
+
+Screening = namedtuple(
+    "Screening", ["start", "distance_km", "theater_name", "movie", "showtime"]
+)
+
+
+def has_location(record):
+    # Theaters that were never geocoded are written with 0, 0
+    return bool(record.get("latitude") or record.get("longitude"))
+
+
+class Timetable:
+    """
+    One theater's screenings of a day, as parallel lists sorted by start. The
+    next day's are appended a day later, so a window may cross into them.
+    """
+
+    __slots__ = ("starts", "screenings")
+
+    def __init__(self, movies, next_movies=()):
+        screenings = sorted(
+            [
+                (showtime.start + offset, movie, showtime)
+                for day, offset in ((movies, 0), (next_movies, MINUTES_PER_DAY))
+                for movie in day
+                for showtime in movie.showtimes
+            ],
+            key=lambda screening: screening[0],
+        )
+        self.starts = [start for start, _, _ in screenings]
+        self.screenings = screenings
+
+    def between(self, start, end):
+        """(start, movie, showtime) of the screenings starting in [start, end)"""
+        return self.screenings[
+            bisect_left(self.starts, start) : bisect_left(self.starts, end)
+        ]
+
+
+class StartingSoonIndex:
+    """
+    The screenings of one business day and of the next morning, per theater
+    in start order, with the theaters' locations in a SpatialIndex. A query
+    only reads the theaters within range, and of those only the screenings
+    in its window.
+    """
+
+    def __init__(self, records, date):
+        self.date = date
+        next_date = (datetime.strptime(date, "%Y-%m-%d") + timedelta(days=1)).strftime(
+            "%Y-%m-%d"
+        )
+        self.timetables = {}
+        theaters = []
+        for record in records:
+            schedules = dict(theater_schedules(record))
+            movies, next_movies = schedules.get(date), schedules.get(next_date)
+            if not (movies or next_movies) or not has_location(record):
+                continue
+            theater_name = record["theater_name"]
+            self.timetables[theater_name] = Timetable(
+                movies_from_json(movies), movies_from_json(next_movies)
+            )
+            theaters.append(
+                {
+                    "theater_name": theater_name,
+                    "latitude": record["latitude"],
+                    "longitude": record["longitude"],
+                }
+            )
+        self.spatial = SpatialIndex(theaters)
+
+    @classmethod
+    def load(cls, path, date):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), date)
+
+    def query(self, lat, lon, now, minutes=WINDOW_MINUTES, max_km=MAX_KM):
+        """
+        Screenings starting within `minutes` of `now`, a business-day offset,
+        at theaters within max_km; soonest first, then nearest first. A start
+        of the next business day is MINUTES_PER_DAY past its own offset.
+        """
+        found = []
+        for distance, theater in self.spatial.within(lat, lon, max_km):
+            theater_name = theater["theater_name"]
+            for start, movie, showtime in self.timetables[theater_name].between(
+                now, now + minutes
+            ):
+                found.append(Screening(start, distance, theater_name, movie, showtime))
+        found.sort(key=lambda screening: (screening.start, screening.distance_km))
+        return found
+
+
+def starting_soon(
+    records, lat, lon, moment=None, minutes=WINDOW_MINUTES, max_km=MAX_KM
+):
+    """Screenings starting soon near a point; `moment` defaults to now"""
+    date, now = business_time(moment or datetime.now())
+    index = StartingSoonIndex(records, date.isoformat())
+    return index.query(lat, lon, now, minutes, max_km)
+
+
+def scan_starting_soon(theaters, lat, lon, now, minutes=WINDOW_MINUTES, max_km=MAX_KM):
+    """
+    The same query by looking at every theater, movie and showtime, as the
+    webapp does; `theaters` is [(theater dict, [Movie])].
+    """
+    found = []
+    for theater, movies in theaters:
+        distance = haversine_km(lat, lon, theater["latitude"], theater["longitude"])
+        if distance > max_km:
+            continue
+        for movie in movies:
+            for showtime in movie.showtimes:
+                if now <= showtime.start < now + minutes:
+                    found.append(
+                        Screening(
+                            showtime.start,
+                            distance,
+                            theater["theater_name"],
+                            movie,
+                            showtime,
+                        )
+                    )
+    found.sort(key=lambda screening: (screening.start, screening.distance_km))
+    return found
+
+
+def synthetic_records(count, movies=12, date="2025-04-01", seed=0):
+    """Schedule records for `count` theaters spread over the Tokyo area"""
+    rng = random.Random(seed)
+    titles = [f"movie {i}" for i in range(movies * 4)]
+    records = []
+    for theater in synthetic_theaters(count, seed):
+        day = []
+        for title in rng.sample(titles, movies):
+            runtime = rng.randrange(90, 150)
+            # From the first show in the morning until the last one before 24:00
+            start = rng.randrange(4 * 60, 6 * 60)
+            showtimes = []
+            while start < 19 * 60:
+                showtimes.append(Showtime(start, start + runtime))
+                start += runtime + rng.randrange(15, 60)
+            day.append(Movie(title, showtimes))
+        records.append({**theater, "scrape_date": date, "movies": movies_to_json(day)})
+    return records
+
+
+def screening_keys(screenings):
+    return sorted(
+        (screening.start, screening.theater_name, screening.movie.title)
+        for screening in screenings
+    )
+
+
+def benchmark(sizes, queries, minutes, max_km):
+    """Print the time per query of the index and of a scan of every showtime"""
+    print(
+        f"{'theaters':>9} {'screenings':>10} {'build ms':>9} "
+        f"{'index us/query':>15} {'scan us/query':>14} {'found':>6}"
+    )
+    rng = random.Random(1)
+    points = [
+        (rng.uniform(35.5, 35.9), rng.uniform(139.4, 139.95), rng.randrange(0, 18 * 60))
+        for _ in range(queries)
+    ]
+    for size in sizes:
+        records = synthetic_records(size)
+        start = time.perf_counter()
+        index = StartingSoonIndex(records, "2025-04-01")
+        build_ms = (time.perf_counter() - start) * 1000
+        theaters = [(record, movies_from_json(record["movies"])) for record in records]
+
+        start = time.perf_counter()
+        indexed = [
+            index.query(lat, lon, now, minutes, max_km) for lat, lon, now in points
+        ]
+        index_us = (time.perf_counter() - start) / queries * 1e6
+
+        start = time.perf_counter()
+        scanned = [
+            scan_starting_soon(theaters, lat, lon, now, minutes, max_km)
+            for lat, lon, now in points
+        ]
+        scan_us = (time.perf_counter() - start) / queries * 1e6
+
+        for (lat, lon, now), a, b in zip(points, indexed, scanned):
+            if screening_keys(a) != screening_keys(b):
+                logger.error(
+                    f"Index and scan disagree at {lat}, {lon}, {format_time(now)}"
+                )
+        screenings = sum(
+            len(timetable.starts) for timetable in index.timetables.values()
+        )
+        found = sum(len(result) for result in indexed) / queries
+        print(
+            f"{size:>9} {screenings:>10} {build_ms:>9.1f} "
+            f"{index_us:>15.1f} {scan_us:>14.1f} {found:>6.1f}"
+        )
+
+
+def main():
+    """List the screenings starting soon near a point, or benchmark the query"""
+    parser = argparse.ArgumentParser(
+        description="Films starting in the next minutes at theaters nearby"
+    )
+    parser.add_argument(
+        "schedules", nargs="?", help="movie_schedules_YYYYMMDD.json to query"
+    )
+    parser.add_argument(
+        "--near",
+        nargs=2,
+        type=float,
+        metavar=("LAT", "LON"),
+        help="Where to look from",
+    )
+    parser.add_argument(
+        "--at",
+        type=lambda text: datetime.strptime(text, "%Y-%m-%d %H:%M"),
+        help='Time to look from, as "YYYY-MM-DD HH:MM" (default: now)',
+    )
+    parser.add_argument(
+        "--minutes",
+        type=int,
+        default=WINDOW_MINUTES,
+        help="Only screenings starting within this many minutes",
+    )
+    parser.add_argument(
+        "--max-km", type=float, default=MAX_KM, help="Only theaters this close"
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="Compare the index with a scan of every showtime on synthetic data",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="*",
+        default=[100, 1000, 5000],
+        help="Synthetic theater counts to benchmark",
+    )
+    parser.add_argument(
+        "--queries", type=int, default=100, help="Queries per benchmark size"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    if args.benchmark:
+        benchmark(args.sizes, args.queries, args.minutes, args.max_km)
+        return
+    if not args.schedules or not args.near:
+        parser.error("a schedule file and --near are required")
+
+    with open(args.schedules, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    moment = args.at or datetime.now()
+    screenings = starting_soon(records, *args.near, moment, args.minutes, args.max_km)
+    if not screenings:
+        print(
+            f"Nothing starts within {args.minutes} minutes of "
+            f"{moment:%Y-%m-%d %H:%M} within {args.max_km} km"
+        )
+        return
+    for screening in screenings:
+        print(
+            f"{format_time(screening.start)}  {screening.distance_km:5.2f} km  "
+            f"{screening.theater_name}  {screening.movie.title}"
+        )
+
+
+if __name__ == "__main__":
+    main()
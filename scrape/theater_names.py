@@ -1,21 +1,33 @@
 import requests
 from bs4 import BeautifulSoup
+import argparse
 import csv
+import logging
+import os
 from geopy.geocoders import Nominatim
 import asyncio
 from googletrans import Translator
+from geocoding import (
+    GEOCODE_CACHE_PATH,
+    GEOCODE_RATE,
+    GeocodeCache,
+    TokenBucket,
+    geocode_rows,
+    has_coordinates,
+)
 
-async def translate_text(text):
-    translator = Translator()
-    # ここで translate() の返り値が coroutine の場合、await で待機します
-    translation = await translator.translate(text, src='ja', dest='en')
-    return translation.text
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# 対象のURL
+THEATER_LIST_URL = "https://movie.jorudan.co.jp/theater/tokyo/"
+THEATERS_CSV_PATH = "scrape/theater_names.csv"
+# movie_scraper.py はこのヘッダーのまま読み込んでいるので変えない
+CSV_HEADER = "theater_name, theater_name_en, address, latitude, longitude"
+CSV_FIELDS = [name.strip() for name in CSV_HEADER.split(",")]
 
-def get_theater_location(theater_name):
-    # user_agentは任意の文字列に設定してください
-    geolocator = Nominatim(user_agent="movie_theater_locator")
-    location = geolocator.geocode(theater_name)
-    return location
 
 def convert_to_alphabet(jp_string):
     # 変換ルールのリスト（置換前, 置換後）
@@ -24,51 +36,121 @@ def convert_to_alphabet(jp_string):
         ("六本木", "Roppongi"),
         # 必要に応じて追加の置換ルールを定義できます
     ]
-    
+
     # 定義された順に文字列を置換する
     for old, new in replacements:
         jp_string = jp_string.replace(old, new)
-    
+
     # 余分な空白があれば削除
     return jp_string.strip()
 
-# 対象のURL
-url = "https://movie.jorudan.co.jp/theater/tokyo/"
 
-# ページを取得
-response = requests.get(url)
-response.raise_for_status()  # エラーがあれば例外を発生させる
+def fetch_theater_names(url=THEATER_LIST_URL):
+    """映画館一覧ページから映画館名を取得する"""
+    # ページを取得
+    response = requests.get(url)
+    response.raise_for_status()  # エラーがあれば例外を発生させる
+
+    # BeautifulSoupでHTMLを解析
+    soup = BeautifulSoup(response.content, "html.parser")
+
+    # CSSセレクタで指定のul要素を取得
+    ul_element = soup.select_one("#site-contents > main > ul")
+    if not ul_element:
+        return None
 
-# BeautifulSoupでHTMLを解析
-soup = BeautifulSoup(response.content, "html.parser")
+    # ul内の全てのli要素の画像のaltが映画館名
+    return [li.find("img").get("alt") for li in ul_element.find_all("li")]
 
-# CSSセレクタで指定のul要素を取得
-ul_element = soup.select_one("#site-contents > main > ul")
 
-if ul_element:
-    # ul内の全てのli要素を取得
-    li_elements = ul_element.find_all("li")
-    
+def load_rows(path):
+    """既存のCSVを読み込む（座標のない行も含む）"""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f, skipinitialspace=True)
+        return [
+            {field: row.get(field) or "" for field in CSV_FIELDS}
+            for row in reader
+            if row.get("theater_name")
+        ]
 
-    with open("theater_names.csv", "a", newline="", encoding="utf-8") as f:
+
+def write_rows(path, rows):
+    """CSVを書き出す。座標のない行は映画館名だけを書く"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        f.write(CSV_HEADER + "\r\n")
         writer = csv.writer(f)
-        writer.writerow(["theater_name"])  # ヘッダー行を書き込む
-
-        # 各li要素のテキストを表示
-        for li in li_elements:
-            # theater_name = li.get_text(strip=True).replace("東京その他", "/").split("/")[-1]
-            theater_name = li.find("img").get("alt")
-            theater_name_en = asyncio.run(translate_text(theater_name))
-            print(theater_name) 
-            print(theater_name_en)
-            location = get_theater_location(theater_name_en)
-            if location is None:
-                location = get_theater_location(theater_name)
-                if location is None:
-                    writer.writerow([theater_name, theater_name_en])  # 各劇場名を書き込む
-                    continue
-            print(location)
-            writer.writerow([theater_name, theater_name_en, location.address, location.latitude, location.longitude])  # 各劇場名を書き込む
-
-else:
-    print("指定したul要素が見つかりませんでした。")
+        for row in rows:
+            if has_coordinates(row):
+                writer.writerow([row[field] for field in CSV_FIELDS])
+            else:
+                writer.writerow([row["theater_name"], row["theater_name_en"]])
+    os.replace(tmp_path, path)
+
+
+def merge_rows(names, rows):
+    """一覧の順に並べ、既存の行は引き継ぐ。一覧から消えた映画館も残す"""
+    existing = {row["theater_name"]: row for row in rows}
+    merged = [
+        existing.pop(name, None)
+        or {"theater_name": name, **dict.fromkeys(CSV_FIELDS[1:], "")}
+        for name in dict.fromkeys(names)
+    ]
+    return merged + list(existing.values())
+
+
+async def update_rows(rows, cache, rate):
+    # 翻訳とジオコーディングのクライアントは1つずつだけ作って使い回す
+    translator = Translator()
+    # user_agentは任意の文字列に設定してください
+    geolocator = Nominatim(user_agent="movie_theater_locator")
+    return await geocode_rows(rows, geolocator, translator, cache, TokenBucket(rate))
+
+
+def main():
+    """映画館一覧を取得し、英語名と座標が未取得・期限切れの行だけ更新する"""
+    parser = argparse.ArgumentParser(description="Build theater_names.csv")
+    parser.add_argument("--csv", default=THEATERS_CSV_PATH, help="CSV to update")
+    parser.add_argument(
+        "--geocode-cache",
+        default=GEOCODE_CACHE_PATH,
+        help="JSON file caching geocoding results by query",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=GEOCODE_RATE,
+        help="Geocoding requests per second",
+    )
+    parser.add_argument(
+        "--no-fetch",
+        action="store_true",
+        help="Only fill in the rows already in the CSV",
+    )
+    args = parser.parse_args()
+
+    rows = load_rows(args.csv)
+    if not args.no_fetch:
+        names = fetch_theater_names()
+        if names is None:
+            print("指定したul要素が見つかりませんでした。")
+            return
+        rows = merge_rows(names, rows)
+
+    cache = GeocodeCache(args.geocode_cache)
+    try:
+        # すべての行を1つのイベントループで処理する
+        geocoded = asyncio.run(update_rows(rows, cache, args.rate))
+    finally:
+        cache.save()
+    write_rows(args.csv, rows)
+    missing = sum(not has_coordinates(row) for row in rows)
+    logger.info(
+        f"Geocoded {geocoded} theaters; {missing} of {len(rows)} still have no location"
+    )
+
+
+if __name__ == "__main__":
+    main()
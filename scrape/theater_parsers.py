@@ -0,0 +1,395 @@
+import logging
+import re
+from enum import Enum
+from functools import lru_cache
+from bs4 import BeautifulSoup, SoupStrainer
+from schedule_model import Movie, ScreenType, Showtime, Subtitle
+
+try:
+    import lxml  # noqa: F401
+
+    DEFAULT_BACKEND = "lxml"
+except ImportError:
+    DEFAULT_BACKEND = "html.parser"
+
+logger = logging.getLogger(__name__)
+
+# How a series' schedule page can be fetched
+FETCH_HTTP = "http"  # the schedule is already in the server-rendered HTML
+FETCH_BROWSER = "browser"  # the schedule is only rendered by JavaScript
+
+
+class TheaterSeries(Enum):
+    TOHO = 1
+    MOVIX = 2
+    AEON = 3
+    TJOY = 4
+    UNITED = 5
+    OTHER = 99
+
+
+# Subtitle and screen-type markers, in order of precedence for titles that
+# carry several. "IMAXレーザー" comes before "IMAX", which it contains.
+SUBTITLE_MARKERS = (("字幕", Subtitle.CAPTION), ("吹替", Subtitle.DUB))
+SCREEN_MARKERS = (
+    ("4DX", ScreenType.FOURDX),
+    ("IMAXレーザー", ScreenType.IMAX_LASER),
+    ("IMAX", ScreenType.IMAX),
+    ("DOLBY", ScreenType.DOLBY),
+    ("BESTIA", ScreenType.BESTIA),
+)
+FULLWIDTH_PARENTHESES = (("（", "("), ("）", ")"))
+# Distinct (title, series) pairs remembered by title_normalize; a run sees the
+# same few hundred titles at every theater of a chain
+TITLE_CACHE_SIZE = 4096
+
+
+class TitleRules:
+    """
+    How one series cleans its raw titles. Every deletion is compiled into one
+    regex applied in a single pass: everything from `cut` on, the literal
+    strings of `remove` and the matches of the `patterns` regexes. The
+    (old, new) pairs of `replace` are then substituted with str.replace,
+    several times faster than str.translate on non-ASCII titles.
+    """
+
+    def __init__(self, cut=None, remove=(), patterns=(), replace=(), strip=False):
+        alternatives = []
+        if cut is not None:
+            alternatives.append(re.escape(cut) + ".*")
+        # Longest first, so that "IMAXレーザー" is deleted whole rather than
+        # leaving "レーザー" behind once "IMAX" is gone
+        alternatives.extend(
+            re.escape(literal) for literal in sorted(remove, key=len, reverse=True)
+        )
+        alternatives.extend(patterns)
+        self.pattern = (
+            re.compile("|".join(alternatives), re.DOTALL) if alternatives else None
+        )
+        self.replace = tuple(replace)
+        self.strip = strip
+
+    def apply(self, title):
+        if self.pattern is not None:
+            title = self.pattern.sub("", title)
+        for old, new in self.replace:
+            title = title.replace(old, new)
+        return title.strip() if self.strip else title
+
+
+DEFAULT_TITLE_RULES = TitleRules(replace=FULLWIDTH_PARENTHESES)
+TITLE_RULES = {
+    TheaterSeries.TOHO: DEFAULT_TITLE_RULES,
+    TheaterSeries.MOVIX: DEFAULT_TITLE_RULES,
+    TheaterSeries.AEON: DEFAULT_TITLE_RULES,
+    # 【IMAX・字幕】デーヴァラ(PG12) -> デーヴァラ
+    TheaterSeries.TJOY: TitleRules(cut="(PG", patterns=(r"【.*?】",), strip=True),
+    # ミッキー17 IMAXレーザー（字幕版） -> ミッキー17
+    TheaterSeries.UNITED: TitleRules(
+        cut="（", remove=("IMAXレーザー", "IMAX", "4DX2D", "DOLBY"), strip=True
+    ),
+}
+
+
+@lru_cache(maxsize=TITLE_CACHE_SIZE)
+def title_normalize(title, theater_series):
+    """(title, Subtitle, ScreenType) of a raw title as one series prints it"""
+    # Substring tests are cheaper than a regex over these few literals
+    sub = Subtitle.ORIGINAL
+    for marker, value in SUBTITLE_MARKERS:
+        if marker in title:
+            sub = value
+            break
+    scrtype = ScreenType.NONE
+    for marker, value in SCREEN_MARKERS:
+        if marker in title:
+            scrtype = value
+            break
+    rules = TITLE_RULES.get(theater_series, DEFAULT_TITLE_RULES)
+    return (rules.apply(title), sub, scrtype)
+
+
+def normalize_many(titles, theater_series):
+    """title_normalize over a batch of titles, normalizing each distinct one once"""
+    results = {
+        title: title_normalize(title, theater_series) for title in dict.fromkeys(titles)
+    }
+    return [results[title] for title in titles]
+
+
+# Registered parsers keyed by TheaterSeries, in registration order
+PARSERS = {}
+
+
+def register_parser(cls):
+    """Class decorator that registers a parser instance for its series"""
+    PARSERS[cls.series] = cls()
+    return cls
+
+
+def get_parser(series):
+    """Return the parser for a series, falling back to the generic one"""
+    return PARSERS.get(series, PARSERS[TheaterSeries.OTHER])
+
+
+def get_theater_series(theater_name):
+    """Determine the theater series based on the theater name"""
+    for series, parser in PARSERS.items():
+        if any(keyword in theater_name for keyword in parser.name_keywords):
+            return series
+    return TheaterSeries.OTHER
+
+
+class TheaterParser:
+    """
+    Describes how to fetch and read one chain's schedule page.
+    Subclasses only declare selectors and extractors; parse() is shared.
+    """
+
+    series = None
+    label = ""
+    # Substrings of theater_name that identify the chain
+    name_keywords = ()
+    fetch_strategy = FETCH_BROWSER
+    # CSS selector that is present once the schedule has rendered
+    ready_selector = None
+    # CSS selectors of one movie's section and its title inside it
+    section_selector = None
+    title_selector = None
+    # Only build the tree for the schedule region; the rest is navigation and ads
+    strainer = None
+    # Treat a page without any movie section as a failed scrape
+    require_sections = False
+    # Clean titles with the series' TITLE_RULES and read their subtitle and
+    # screen type
+    title_rules = False
+
+    def sections(self, soup):
+        return soup.select(self.section_selector)
+
+    def title(self, section):
+        title_elem = section.select_one(self.title_selector)
+        if not title_elem:
+            return None
+        return title_elem.get_text(strip=True)
+
+    def showtimes(self, section):
+        """Return the section's Showtimes; None entries are dropped"""
+        raise NotImplementedError
+
+    def normalize_title(self, title):
+        """Return the title fields of a Movie"""
+        return {"title": title}
+
+    def normalize_titles(self, titles):
+        """normalize_title over all of a page's titles"""
+        if not self.title_rules:
+            return [self.normalize_title(title) for title in titles]
+        return [
+            {"title": title, "subtitle": subtitle, "screen_type": scrtype}
+            for title, subtitle, scrtype in normalize_many(titles, self.series)
+        ]
+
+    def make_soup(self, html, backend=None, strain=True):
+        return BeautifulSoup(
+            html,
+            backend or DEFAULT_BACKEND,
+            parse_only=self.strainer if strain else None,
+        )
+
+    def parse(self, html, backend=None, strain=True):
+        """
+        Extract the Movies from a schedule page.
+        Returns None when require_sections is set and no movie section was found.
+        """
+        return self.parse_soup(self.make_soup(html, backend, strain))
+
+    def parse_soup(self, soup):
+        """Extract the movies and showtimes from an already parsed page"""
+        movies = []
+        # Find all movie sections
+        movie_sections = self.sections(soup)
+        logger.debug("Found %d movie sections", len(movie_sections))
+        if not movie_sections and self.require_sections:
+            return None
+
+        titles, schedules = [], []
+        for section in movie_sections:
+            movie_title = self.title(section)
+            if movie_title is None:
+                continue
+
+            showtimes = [s for s in self.showtimes(section) if s is not None]
+            if showtimes:
+                titles.append(movie_title)
+                schedules.append(showtimes)
+
+        # A page repeats a title for each of its formats; normalize them together
+        for fields, showtimes in zip(self.normalize_titles(titles), schedules):
+            movies.append(Movie(showtimes=showtimes, **fields))
+        return movies
+
+
+def select_text(elem, selector):
+    """Text of the first match of selector inside elem, or None when missing"""
+    found = elem.select_one(selector)
+    return found.get_text(strip=True) if found else None
+
+
+def split_showtime(text, separator="～"):
+    """Parse "11:45～　14:50" into a Showtime"""
+    showtime_parts = text.split(separator)
+    return Showtime.parse(showtime_parts[0].strip(), showtime_parts[1].strip())
+
+
+@register_parser
+class TohoParser(TheaterParser):
+    series = TheaterSeries.TOHO
+    label = "TOHO Cinemas"
+    name_keywords = ("TOHOシネマズ",)
+    ready_selector = "div.schedule-body-section-item"
+    section_selector = "div.schedule-body-section-item"
+    strainer = SoupStrainer("div", class_="schedule-body-section-item")
+    title_selector = "h5.schedule-body-title"
+
+    def showtimes(self, section):
+        showtimes = []
+        for elem in section.select("p.time"):
+            showtimes.append(
+                Showtime.parse(
+                    select_text(elem, "span.start"), select_text(elem, "span.end")
+                )
+            )
+        return showtimes
+
+
+@register_parser
+class MovixParser(TheaterParser):
+    series = TheaterSeries.MOVIX
+    label = "MOVIX"
+    name_keywords = ("MOVIX",)
+    fetch_strategy = FETCH_HTTP
+    ready_selector = "div.list p.time"
+    section_selector = "div.list"
+    strainer = SoupStrainer("div", class_="list")
+    title_selector = "h2"
+
+    def showtimes(self, section):
+        return [
+            split_showtime(elem.get_text(strip=True))
+            for elem in section.select("p.time")
+        ]
+
+    def normalize_title(self, title):
+        # Remove "(上映時間: 151分)" or similar
+        return {"title": title.split("（")[0].strip()}
+
+
+@register_parser
+class AeonParser(TheaterParser):
+    series = TheaterSeries.AEON
+    label = "イオンシネマ"
+    name_keywords = ("イオンシネマ",)
+    fetch_strategy = FETCH_HTTP
+    ready_selector = "div.p-schedule__time"
+    section_selector = "div.p-schedule__informations"
+    strainer = SoupStrainer("div", class_="p-schedule__informations")
+    title_selector = "h2"
+
+    def showtimes(self, section):
+        showtimes = []
+        for elem in section.select("div.p-schedule__time"):
+            end_time = select_text(elem, "small")
+            if end_time:
+                end_time = end_time.replace("~", "")
+            showtimes.append(Showtime.parse(select_text(elem, "span"), end_time))
+        return showtimes
+
+
+@register_parser
+class TjoyParser(TheaterParser):
+    series = TheaterSeries.TJOY
+    label = "T・ジョイ"
+    name_keywords = ("ジョイ",)
+    ready_selector = "p.schedule-time"
+    section_selector = "section.section-container"
+    strainer = SoupStrainer("section", class_="section-container")
+    title_selector = "h5.js-title-film"
+    title_rules = True
+
+    def showtimes(self, section):
+        return [
+            split_showtime(elem.get_text(strip=True))
+            for elem in section.select("p.schedule-time")
+        ]
+
+
+@register_parser
+class UnitedParser(TheaterParser):
+    series = TheaterSeries.UNITED
+    label = "ユナイテッド・シネマ"
+    name_keywords = ("ユナイテッド",)
+    fetch_strategy = FETCH_HTTP
+    ready_selector = "li.startTime"
+    section_selector = "li.clearfix"
+    strainer = SoupStrainer("li", class_="clearfix")
+    title_selector = "span.movieTitle"
+    title_rules = True
+
+    def showtimes(self, section):
+        showtime_elems = zip(
+            section.select("li.startTime"), section.select("li.endTime")
+        )
+        showtimes = []
+        for startelem, endelem in showtime_elems:
+            start_time = startelem.get_text(strip=True)
+            end_time = endelem.get_text(strip=True).replace("～", "").strip()
+            showtimes.append(Showtime.parse(start_time, end_time))
+        return showtimes
+
+
+@register_parser
+class GenericParser(TheaterParser):
+    """
+    Fallback for theaters that don't have a chain-specific parser.
+    Attempts to find movie titles and showtimes based on common patterns.
+    """
+
+    series = TheaterSeries.OTHER
+    label = "generic"
+    ready_selector = ".movie-item, .schedule-movie, .movie, article, .content-block"
+    require_sections = True
+
+    def sections(self, soup):
+        # Try different selectors that might contain movie information
+        return (
+            soup.select(".movie-item")
+            or soup.select(".schedule-movie")
+            or soup.select(".movie")
+            or soup.select("article")
+            or soup.select(".content-block")
+        )
+
+    def title(self, section):
+        title_elem = (
+            section.select_one(".title")
+            or section.select_one("h2")
+            or section.select_one("h3")
+            or section.select_one("strong")
+        )
+        if not title_elem:
+            return None
+        return title_elem.get_text(strip=True) or None
+
+    def showtimes(self, section):
+        time_elems = (
+            section.select(".time")
+            or section.select(".showtime")
+            or section.select("time")
+            or section.select(".schedule-time")
+        )
+        # Keep only the elements that hold a time, with an end time when listed
+        return [
+            Showtime.from_text(time_elem.get_text(strip=True))
+            for time_elem in time_elems
+        ]
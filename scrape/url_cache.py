@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+URL_CACHE_PATH = "scrape/theater_url_cache.json"
+URL_CACHE_TTL_DAYS = 30
+
+
+class UrlCache:
+    """
+    On-disk cache of theater schedule URLs keyed by theater_name.
+    Each entry records when the URL was last resolved so it can expire after a TTL.
+    """
+
+    def __init__(self, path=URL_CACHE_PATH, ttl_days=URL_CACHE_TTL_DAYS, refresh=False):
+        self.path = path
+        self.ttl = timedelta(days=ttl_days)
+        # When refresh is set every entry resolved before this run is treated as
+        # a miss, but the old entries are still kept as an offline fallback
+        self.refresh = refresh
+        # Entries carry whole seconds, so an entry put in this very second is new
+        self.started_at = datetime.now().replace(microsecond=0)
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading URL cache {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, theater_name, allow_stale=False):
+        """Return the cached URL, or None on a miss or when the entry has expired"""
+        with self._lock:
+            entry = self._entries.get(theater_name)
+        if not entry:
+            return None
+        if allow_stale:
+            return entry["url"]
+        resolved_at = datetime.fromisoformat(entry["resolved_at"])
+        if self.refresh and resolved_at < self.started_at:
+            return None
+        if datetime.now() - resolved_at > self.ttl:
+            return None
+        return entry["url"]
+
+    def put(self, theater_name, url):
+        """Record a freshly resolved URL and write the cache back to disk"""
+        with self._lock:
+            self._entries[theater_name] = {
+                "url": url,
+                "resolved_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            try:
+                self._save()
+            except Exception as e:
+                logger.error(f"Error saving URL cache {self.path}: {e}")
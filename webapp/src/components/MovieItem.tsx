@@ -24,8 +24,10 @@ const MovieItem: React.FC<MovieItemProps> = ({ movie }) => {
       <div className="showtimes">
         <h5>上映時間:</h5>
         <ul className="showtime-list">
-          {showtimes.map((time, index) => (
-            <li key={index} className="showtime">{time}</li>
+          {showtimes.map(([start, end], index) => (
+            <li key={index} className="showtime">
+              {end ? `${start}〜${end}` : start}
+            </li>
           ))}
         </ul>
       </div>
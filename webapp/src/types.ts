@@ -1,6 +1,12 @@
+// [start, end] as "HH:MM"; times after midnight continue past 24:00 ("25:10"),
+// and end is null when the theater doesn't list it
+export type Showtime = [string, string | null];
+
 export interface Movie {
   title: string;
-  showtimes: string[];
+  subtitle?: string; // "字幕", "吹替" or "" where the chain states it
+  screen_type?: string; // "IMAX", "4DX", ... or ""
+  showtimes: Showtime[];
 }
 
 export interface Theater {
@@ -11,6 +17,7 @@ export interface Theater {
   longitude: number;
   movies: Movie[];
   scrape_date: string;
+  stale?: boolean; // Scraping failed; these are the last-known-good schedules
   distance?: number; // Distance from user's location (added at runtime)
 }
 